@@ -3,53 +3,180 @@ import pandas as pd
 import json
 import os
 import re
+import tempfile
+import threading
+import time
+from collections import Counter
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from typing import Dict, Any
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 from pathlib import Path
-import seaborn as sns
-from langfuse.decorators import observe
-from langfuse.openai import OpenAI
-import boto3
-from pycaret.regression import load_model, predict_model
+# matplotlib, seaborn, langfuse, boto3 and pycaret are imported lazily - the input page does not need them
 
-from utils import utils_css
+from utils import rule_parser, utils_css
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
+@lru_cache(maxsize=1)
+def get_client():
+    # Initialize OpenAI client on first use
+    from langfuse.openai import OpenAI
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+    )
 
-# Initialize S3 client
-s3 = boto3.client("s3")
+@lru_cache(maxsize=1)
+def get_s3():
+    # Initialize S3 client on first use
+    import boto3
+    return boto3.client("s3")
+
+def observe_lazily(func):
+    """langfuse @observe() applied on the first call, so langfuse is not imported at startup"""
+    traced = None
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal traced
+        if traced is None:
+            from langfuse.decorators import observe
+            traced = observe()(func)
+        return traced(*args, **kwargs)
+    return wrapper
 
 BUCKET_NAME = "wk1"
+COMPACT_DTYPES = {"finish_sec": "int32", "age": "int8", "gender": "category"}
+
+def _compact_dtypes(df):
+    # Integer columns with missing values cannot be cast to int - they stay float32
+    return df.astype({
+        col: dtype if dtype == "category" or df[col].notna().all() else "float32"
+        for col, dtype in COMPACT_DTYPES.items()
+    })
 
 @st.cache_data
 def get_model():
+    from pycaret.regression import load_model
     try:
         return load_model("time_sec_model", platform="aws", authentication={"bucket": BUCKET_NAME, "path": "zadanie_9/models"})
     except Exception as e:
         st.error(f"Błąd ładowania modelu: {str(e)}.")
         raise Exception("Nie znaleziono modelu.")
 
-@st.cache_data
-def get_full_csv_df(year):
-    file_name = f"halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
-    s3_file_name = "zadanie_9/current/" + file_name
-    local_path = file_name
+def _load_csv(file_name, s3_file_name, etag):
+    import pyarrow.feather as feather
+    # Columnar cache keyed by the S3 ETag - download and CSV parsing only once per object version
+    cache_path = f"{os.path.splitext(file_name)[0]}.{etag}.feather"
+    if os.path.exists(cache_path):
+        return feather.read_feather(cache_path, memory_map=True)
+    # Unique file names per writer - sessions of one process may load the same year concurrently
+    directory = os.path.dirname(cache_path) or "."
+    local_path = _temp_path(directory, ".csv")
     try:
-        s3.download_file(BUCKET_NAME, s3_file_name, local_path)
+        get_s3().download_file(BUCKET_NAME, s3_file_name, local_path)
+        df = _compact_dtypes(pd.read_csv(local_path, sep=";"))
     except Exception as e:
         st.error(f"Błąd ładowania csv z maratonem: {str(e)}.")
         raise Exception(f"Błąd ładowania {s3_file_name} do {local_path}")
-        pass
-    return pd.read_csv(local_path, sep=";")
+    finally:
+        # The CSV is only needed until it is parsed
+        _remove_files([local_path])
+    tmp_path = _temp_path(directory, ".tmp")
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Older versions of the cache are never read again
+    _remove_files(_other_versions(cache_path))
+    return df
+
+def _temp_path(directory, suffix):
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    return path
+
+def _other_versions(cache_path):
+    directory = os.path.dirname(cache_path) or "."
+    stem = os.path.basename(cache_path).split(".", 1)[0]
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if re.fullmatch(rf"{re.escape(stem)}\.[0-9A-Za-z-]+\.feather", name)
+            and name != os.path.basename(cache_path)]
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # already removed by another session, or still mapped on Windows
+
+REVALIDATE_SECONDS = float(os.getenv("S3_REVALIDATE_SECONDS", "300"))
+
+@st.cache_resource
+def get_csv_cache():
+    # Shared by all sessions: per-year entries and hit / miss / revalidated counters
+    return {"entries": {}, "lock": threading.Lock(), "stats": Counter()}
+
+def get_csv_entry(year):
+    """(etag, df) for the year; revalidated with a HEAD request every REVALIDATE_SECONDS instead of a TTL reload"""
+    file_name = f"halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
+    s3_file_name = "zadanie_9/current/" + file_name
+    cache = get_csv_cache()
+    with cache["lock"]:
+        entry = cache["entries"].setdefault(year, {"lock": threading.Lock(), "etag": None, "df": None, "checked_at": 0.0})
+    # one load per year at a time - other sessions wait for its result
+    with entry["lock"]:
+        if entry["etag"] is not None and time.monotonic() - entry["checked_at"] < REVALIDATE_SECONDS:
+            result = "hit"
+        else:
+            try:
+                etag = get_s3().head_object(Bucket=BUCKET_NAME, Key=s3_file_name)["ETag"].strip('"')
+            except Exception as e:
+                st.error(f"Błąd ładowania csv z maratonem: {str(e)}.")
+                raise
+            if etag == entry["etag"]:
+                result = "revalidated"
+            else:
+                result = "miss"
+                entry["df"] = _load_csv(file_name, s3_file_name, etag)
+                entry["etag"] = etag
+            entry["checked_at"] = time.monotonic()
+        with cache["lock"]:
+            cache["stats"][result] += 1
+        return entry["etag"], entry["df"]
+
+def get_full_csv_df(year):
+    # The frame is shared across sessions - filter into new frames, never modify it in place
+    return get_csv_entry(year)[1]
+
+MAX_FINISH_SEC = 4 * 3600
+
+def get_rank_table(year, sex=None):
+    etag, df = get_csv_entry(year)
+    return _build_rank_table(year, sex, etag, df)
+
+# etag is part of the cache key - a new object version gets a new table
+@st.cache_resource(max_entries=12)
+def _build_rank_table(year, sex, etag, _df):
+    # counts[s] = number of runners faster than s seconds (0-4h), so the place is a single lookup
+    import numpy as np
+    df = _df
+    if sex is not None:
+        df = df[df['gender'] == sex]
+    seconds = np.clip(np.ceil(df['finish_sec'].dropna().to_numpy(dtype=float)).astype(int), 0, MAX_FINISH_SEC + 1)
+    counts = np.zeros(MAX_FINISH_SEC + 2, dtype=np.int32)
+    counts[1:] = np.cumsum(np.bincount(seconds, minlength=MAX_FINISH_SEC + 2))[:-1]
+    counts[-1] = len(seconds)
+    counts.setflags(write=False)
+    return counts
+
+def rank_by_time(year, finish_sec, sex=None):
+    counts = get_rank_table(year, sex)
+    return int(counts[min(max(int(finish_sec), 0), MAX_FINISH_SEC + 1)]) + 1, int(counts[-1])
 
 def html(st, html):
     st.markdown(html, unsafe_allow_html=True)
@@ -96,11 +223,23 @@ def parse_time(time_str: str) -> float:
         return minutes * 60 + seconds
     raise ValueError(f"Could not parse time: {time_str}")
 
-@observe()
 def parse_user_input(text: str) -> RunnerInfo:
+    """Parse user input - local rules first, OpenAI only when the rules are not confident"""
+    rule_result = rule_parser.extract_runner_data(text)
+    if rule_result is not None:
+        return RunnerInfo(
+            age=rule_result["age"],
+            sex=rule_result["gender"],
+            time_5k=rule_result["time_5km_sec"],
+            pace_5k=rule_result["pace"],
+        )
+    return parse_user_input_with_llm(text)
+
+@observe_lazily
+def parse_user_input_with_llm(text: str) -> RunnerInfo:
     """Parse user input using OpenAI to extract runner information"""
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {
@@ -356,6 +495,7 @@ def display_data_page():
     if estimate_button:
         with st.spinner("Obliczanie czasu..."):
             try:
+                from pycaret.regression import predict_model
                 model = get_model()
 
                 input_data = pd.DataFrame([st.session_state.runner_info.to_dict()])
@@ -374,7 +514,11 @@ def display_data_page():
 
     back_button()
 
+@st.fragment
 def place(year):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     df_all = get_full_csv_df(year)
 
     runner = st.session_state.runner_info
@@ -409,15 +553,11 @@ def place(year):
     plt.tight_layout()
     st.pyplot(fig)    
 
-    df_plus_1 = pd.concat([df, df_1], ignore_index=True)
-    df_plus_1.sort_values(by='finish_sec', ascending=True, inplace=True)
-    df_plus_1['Miejsce'].interpolate(method='linear', inplace=True)
-
-    if sex:
-        df_plus_1['Miejsce'] = df_plus_1['Miejsce'] * df.size / df_all.size
+    # place from the precomputed cumulative counts instead of sorting the whole frame
+    rank, total = rank_by_time(year, st.session_state.prediction_seconds, sex)
 
     html(st, "<h6>Poniżej to chyba ilość startujących i Twoje miejsce</h6>")
-    df_plus_1[df_plus_1['5_km_sec'].isna()]['Miejsce']
+    st.dataframe(pd.DataFrame({'Miejsce': [rank], 'Startujących': [total]}), hide_index=True)
 
 def display_results_page():
 
@@ -449,7 +589,8 @@ def display_results_page():
                 <div class="metric-value">{runner.time_5k_str()}</div>
             </div>
         """)
-    tab1, tab2, tab3 = st.tabs(["Czas", "Miejsce w 2023", "Miejsce w 2024"])
+    # only the selected tab runs (on_change="rerun" + tab.open), place() reruns as its own fragment
+    tab1, tab2, tab3 = st.tabs(["Czas", "Miejsce w 2023", "Miejsce w 2024"], key="results_tabs", on_change="rerun")
     with tab1:
         html(st, f"""
             <div>
@@ -461,11 +602,13 @@ def display_results_page():
             </div>
         """)
 
-    with tab2:
-        place(2023)
+    if tab2.open:
+        with tab2:
+            place(2023)
 
-    with tab3:
-        place(2024)
+    if tab3.open:
+        with tab3:
+            place(2024)
 
     back_button()
 
@@ -0,0 +1,118 @@
+# rule_parser.py
+"""Deterministyczny parser danych biegacza - szybka ścieżka przed zapytaniem do LLM.
+
+Rozpoznaje typowe polskie opisy, np. "Jestem 35-letnim mężczyzną, a mój czas na 5 km to 22:30"
+albo "Mam 28 lat, jestem kobietą, tempo 5'06''". Zwraca wynik tylko wtedy, gdy każda
+z trzech wartości (wiek, płeć, czas na 5 km) występuje w tekście dokładnie raz
+i jednoznacznie - w przeciwnym razie None i decyzję podejmuje LLM. Czas bez tempa musi
+być powiązany z 5 km, a tekst wspominający inny dystans (10 km, półmaraton, maraton)
+zawsze trafia do LLM.
+"""
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+AGE_RANGE = (18, 105)
+TIME_5KM_RANGE = (900, 7200)
+
+_AGE_PATTERNS = [
+    re.compile(r'(?<!\d)(\d{2,3})\s*-?\s*letni\w*'),
+    re.compile(r'(?<![\d:])(\d{2,3})\s*(?:lat|lata|latek|l\.)(?!\w)'),
+    re.compile(r'\b(?:wiek|lat)\s*[:=-]?\s*(\d{2,3})(?![\d:])'),
+]
+
+_MALE = re.compile(r"\b(?:mężczyzn\w*|facet\w*|chłopak\w*|pan|male|man)\b|(?<![\w'\"’”])m(?![\w'\"’”])")
+_FEMALE = re.compile(r"\b(?:kobiet\w*|dziewczyn\w*|pani|female|woman)\b|(?<![\w'\"’”])k(?![\w'\"’”])")
+_NEGATION = re.compile(r'\bnie\s+(?:jestem\s+)?$')
+
+_TIME_PATTERNS = [
+    # 5'06'' / 5’06” - minuty'sekundy
+    re.compile(r"(?<![\d:])(\d{1,3})\s*['’′]\s*(\d{2})(?:\s*(?:''|\"|”|″|’’))?"),
+    # 4"59' - zapis minuty"sekundy'
+    re.compile(r"(?<![\d:])(\d{1,3})\s*[\"”″]\s*(\d{2})\s*['’′]*"),
+    # 22:30, 1:05:30
+    re.compile(r'(?<![\d:])(?:(\d{1,2}):)?(\d{1,3}):(\d{2})(?![\d:])'),
+    # 25 minut 30 sekund, 25 min 30 s, 25 minut
+    re.compile(r'(?<![\d:])(\d{1,3})\s*min\w*\.?(?:\s*(?:i\s*)?(\d{1,2})\s*s(?:ek\w*|\.)?\b)?'),
+]
+
+_PACE_MARKERS = re.compile(r'tempo|tempa|tempie|/\s*km\b|na\s+(?:1\s+)?(?:km|kilometr)\b|min/km')
+_SPEED_MARKERS = re.compile(r'km\s*/\s*h|km/godz|kilometr\w* na godzin')
+_DISTANCE = re.compile(r'(?<![\d,.:])(\d+(?:[.,]\d+)?)\s*(?:km|k|kilometr\w*)(?![\w/])')
+_OTHER_RACES = re.compile(r'maraton|\bhalf\b|\bmarathon')
+_FIVE_KM_WORDS = re.compile(r'piątk\w*|parkrun\w*')
+
+
+def _distances(text: str) -> Set[float]:
+    return {float(m.group(1).replace(',', '.')) for m in _DISTANCE.finditer(text)}
+
+
+def _find_age(text: str) -> Optional[int]:
+    ages = {int(m.group(1)) for pattern in _AGE_PATTERNS for m in pattern.finditer(text)}
+    if len(ages) != 1:
+        return None
+    age = ages.pop()
+    return age if AGE_RANGE[0] <= age <= AGE_RANGE[1] else None
+
+
+def _find_gender(text: str) -> Optional[str]:
+    found = set()
+    for gender, pattern in (('M', _MALE), ('F', _FEMALE)):
+        for m in pattern.finditer(text):
+            if _NEGATION.search(text[max(0, m.start() - 20):m.start()]):
+                return None
+            found.add(gender)
+    return found.pop() if len(found) == 1 else None
+
+
+def _find_times(text: str) -> List[int]:
+    """Wszystkie niezachodzące na siebie wystąpienia czasu/tempa, w sekundach"""
+    spans: List[Tuple[int, int]] = []
+    values: List[int] = []
+    for i, pattern in enumerate(_TIME_PATTERNS):
+        for m in pattern.finditer(text):
+            if any(m.start() < end and start < m.end() for start, end in spans):
+                continue
+            if i == 2:
+                hours, minutes, seconds = m.group(1), m.group(2), m.group(3)
+                value = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+            else:
+                value = int(m.group(1)) * 60 + int(m.group(2) or 0)
+            spans.append(m.span())
+            values.append(value)
+    return values
+
+
+def _find_time_5km(text: str) -> Tuple[Optional[int], Optional[str]]:
+    """Zwraca (czas na 5 km w sekundach, tempo jako 'M:SS' lub None)"""
+    if _SPEED_MARKERS.search(text):
+        return None, None
+    # inny dystans w tekście - czas może dotyczyć jego, a nie 5 km
+    distances = _distances(text)
+    if _OTHER_RACES.search(text) or distances - {1.0, 5.0}:
+        return None, None
+    times = _find_times(text)
+    if len(times) != 1:
+        return None, None
+
+    value = times[0]
+    if _PACE_MARKERS.search(text):
+        pace = f"{value // 60}:{value % 60:02d}"
+        value *= 5
+    elif 5.0 in distances or _FIVE_KM_WORDS.search(text):
+        pace = None
+    else:
+        return None, None
+    if not (TIME_5KM_RANGE[0] <= value <= TIME_5KM_RANGE[1]):
+        return None, None
+    return value, pace
+
+
+def extract_runner_data(text: str) -> Optional[Dict]:
+    """Wiek, płeć ('M'/'F') i czas na 5 km z tekstu albo None, gdy wynik nie jest pewny"""
+    normalized = ' '.join(text.lower().split())
+    age = _find_age(normalized)
+    gender = _find_gender(normalized)
+    time_5km_sec, pace = _find_time_5km(normalized)
+    if age is None or gender is None or time_5km_sec is None:
+        return None
+    return {'age': age, 'gender': gender, 'time_5km_sec': time_5km_sec, 'pace': pace}
@@ -1,22 +1,41 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import boto3
 import json
 import re
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import os
+import threading
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Ładowanie zmiennych środowiskowych
 load_dotenv()
 
-# Import dodatkowych modułów
-from langfuse.openai import OpenAI
-import pycaret.regression as pcr
+# Import dodatkowych modułów - ciężkie moduły ładowane leniwie (strona wprowadzania ich nie potrzebuje)
+from lazy_imports import HEAVY_MODULES, lazy_module, preload_in_background
+
+langfuse_openai = lazy_module('langfuse.openai')
+pcr = lazy_module('pycaret.regression')
+
+import metrics
+import prefetch
+import process_pool
+import session_store
+import shared_arrays
+import storage
+from concurrent_loader import LoadResult, load_concurrently
+from chart_cache import ChartBackground, composite_marker, render_background
+from dataset_cache import load_results_frame
+from density_chart import build_density, density_spec, with_prediction
+from llm_cache import LLMCache, cache_key
+from prediction_grid import DEFAULT_GRID_PATH, PredictionGrid
+from rank_tables import DEFAULT_TABLES_PATH, RankTables, build_year_arrays, historical_file_name
+from results_cache import ResultsCache, YearResult, profile_key
+from results_dataset import ResultsDataset, ResultsView
+from rule_parser import extract_runner_data
+from serving_model import DEFAULT_ARTIFACT_PATH, ServingModel, predict_fast
 
 # Konfiguracja strony
 st.set_page_config(
@@ -70,22 +89,52 @@ def init_session_state():
         st.session_state.runner_data = {}
     if 'prediction' not in st.session_state:
         st.session_state.prediction = None
+    if 'results_key' not in st.session_state:
+        st.session_state.results_key = None
     if 'data_history' not in st.session_state:
         st.session_state.data_history = []
     if 'history_index' not in st.session_state:
         st.session_state.history_index = -1
 
+# Stan sesji poza procesem (session_store.py) - identyfikator sesji w adresie strony (?sid=...)
+@st.cache_resource
+def get_session_store():
+    return session_store.get_store()
+
+def restore_session():
+    """Raz na połączenie: odtwarza zapisany stan sesji (np. po restarcie procesu albo na innej replice)"""
+    if 'session_id' in st.session_state:
+        return
+    session_id = st.query_params.get('sid') or session_store.new_session_id()
+    st.query_params['sid'] = session_id
+    saved = get_session_store().load(session_id)
+    if saved is not None:
+        for name, value in saved.items():
+            # JSON nie ma krotek - klucz cache wyników wraca jako lista
+            st.session_state[name] = tuple(value) if name == 'results_key' and value else value
+        metrics.count('sessions_restored_total')
+    st.session_state.session_id = session_id
+
+def persist_session():
+    """Po przebiegu skryptu zapisuje migawkę stanu, jeśli się zmieniła"""
+    state = session_store.snapshot(st.session_state)
+    serialized = json.dumps(state, ensure_ascii=False, sort_keys=True)
+    if serialized != st.session_state.get('saved_session'):
+        get_session_store().save(st.session_state.session_id, state)
+        st.session_state.saved_session = serialized
+
+restore_session()
 init_session_state()
 
-# Klient S3
+# Magazyn plików (S3 albo dołączone data/ przy STORAGE_BACKEND=local) z cache w pamięci i na dysku
 @st.cache_resource
-def get_s3_client():
-    return boto3.client('s3')
+def get_store() -> storage.TieredStore:
+    return storage.get_store()
 
 # Klient OpenAI
 @st.cache_resource
 def get_openai_client():
-    return OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return langfuse_openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
 # Funkcje pomocnicze
 def time_to_seconds(time_str: str) -> int:
@@ -116,39 +165,156 @@ def pace_to_seconds_5km(pace_str: str) -> int:
     else:
         raise ValueError("Nieprawidłowy format tempa")
 
-# Ładowanie modelu
-@st.cache_data
+# Ładowanie modelu (cache_resource - potok PyCaret nie jest kopiowany przy każdym odczycie)
+@st.cache_resource
 def load_prediction_model():
     try:
-        s3 = get_s3_client()
-        model = pcr.load_model('time_sec_model', 
-                              platform='aws',
-                              authentication={'bucket': 'wk1', 
-                                            'path': 'zadanie_9/models/'})
+        with metrics.stage('load_model'):
+            model_path = get_store().local_path('model/time_sec_model.pkl')
+            model = pcr.load_model(model_path[:-len('.pkl')])
         return model
     except Exception as e:
         st.error(f"Błąd ładowania modelu: {e}")
         return None
 
-# Ładowanie danych historycznych
-@st.cache_data
-def load_historical_data(year: int):
+# Lekki predyktor (artefakt z `python serving_model.py export`) - bez PyCaret w ścieżce żądania
+@st.cache_resource
+def load_serving_model() -> Optional[ServingModel]:
     try:
-        s3 = get_s3_client()
-        csv_path = f'zadanie_9/current/halfmarathon_wroclaw_{year}__final_cleaned_full.csv'
-        
-        response = s3.get_object(Bucket='wk1', Key=csv_path)
-        df = pd.read_csv(response['Body'], sep=';')
-        return df
+        with metrics.stage('load_serving_model'):
+            return ServingModel.load(os.getenv('SERVING_MODEL_PATH', DEFAULT_ARTIFACT_PATH))
+    except (OSError, ValueError):
+        return None
+
+# Tablica predykcji dla całej dziedziny wejść (`python prediction_grid.py build`) - predykcja to odczyt z tablicy
+@st.cache_resource
+def load_prediction_grid() -> Optional[PredictionGrid]:
+    """Tablica predykcji zgodna z bieżącym modelem; None -> lekki artefakt albo PyCaret"""
+    try:
+        model_file = get_store().local_path('model/time_sec_model.pkl')
+    except Exception:
+        model_file = None  # modelu nie da się pobrać - nie ma z czym porównać, tablica zostaje
+    try:
+        with metrics.stage('load_prediction_grid'):
+            return PredictionGrid.load(os.getenv('PREDICTION_GRID_PATH', DEFAULT_GRID_PATH), model_file)
+    except OSError:
+        return None
+    except ValueError as e:
+        # np. model przetrenowany po zbudowaniu tablicy - tablica dawałaby stare prognozy
+        metrics.logger.warning("Tablica predykcji pominięta: %s", e)
+        return None
+
+# Gotowe wyniki dla profili biegaczy - wspólne dla sesji (results_cache.py)
+@st.cache_resource
+def get_results_cache() -> ResultsCache:
+    return ResultsCache()
+
+def needs_pycaret() -> bool:
+    """Pełny potok PyCaret jest potrzebny tylko bez tablicy predykcji i bez lekkiego artefaktu"""
+    return load_prediction_grid() is None and load_serving_model() is None
+
+def predictor_version() -> str:
+    """Wersja modelu, który policzy prognozę - część klucza cache wyników"""
+    grid = load_prediction_grid()
+    if grid is not None:
+        return f"grid:{grid.version}"
+    serving_model = load_serving_model()
+    if serving_model is not None:
+        return f"serving:{serving_model.version}"
+    return 'pycaret'
+
+# Ładowanie danych historycznych: bieżąca wersja pliku (ETag sprawdzany w magazynie najwyżej co
+# STORAGE_REVALIDATE_SECONDS) - ta sama, którą widzą procesy robocze (process_pool.py)
+def fetch_historical_data(year: int) -> ResultsDataset:
+    return fetch_dataset_version(year, get_store().head(historical_key(year)).etag)
+
+def historical_key(year: int) -> str:
+    return 'current/' + historical_file_name(year)
+
+# Jeden niezmienny zbiór na wersję danych, wspólny dla wszystkich sesji
+# (cache_resource - bez kopii DataFrame przy każdym odczycie; wyjątek nie jest cachowany)
+@st.cache_resource(max_entries=8)
+def fetch_dataset_version(year: int, etag: str) -> ResultsDataset:
+    store = get_store()
+    csv_key = historical_key(year)
+    
+    # Lokalny cache Feather kluczowany ETagiem - CSV parsowany tylko po zmianie pliku
+    def build() -> ResultsDataset:
+        return ResultsDataset.from_frame(load_results_frame(store, csv_key), etag)
+    
+    if not shared_arrays.enabled():
+        return build()
+    # SHARED_DATA_DIR: kolumny publikowane raz na host, każdy proces tylko je mapuje
+    columns = shared_arrays.attach_or_publish(f'results_{year}', etag, lambda: build().columns)
+    return ResultsDataset.from_columns(columns, etag)
+
+def load_historical_data(year: int) -> Optional[ResultsDataset]:
+    try:
+        return fetch_historical_data(year)
     except Exception as e:
         st.error(f"Błąd ładowania danych historycznych dla roku {year}: {e}")
         return None
 
-# Parsowanie danych z pomocą OpenAI
+RESULT_YEARS = [2023, 2024]
+
+def with_script_ctx(func):
+    """Opakowuje funkcję do wywołania w wątku puli z kontekstem bieżącej sesji - cache Streamlit działa jak w wątku skryptu"""
+    ctx = get_script_run_ctx()
+    
+    def wrapper(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args)
+    return wrapper
+
+# Wszystkie lata równolegle - na zimnym cache czas najwolniejszego roku zamiast sumy
+def load_years_concurrently(years: List[int]) -> Dict[int, LoadResult]:
+    def load(year: int) -> ResultsDataset:
+        # dołącz do rozgrzewania rozpoczętego na stronie wprowadzania zamiast pobierać drugi raz
+        prefetch.join(f'year_{year}')
+        return fetch_historical_data(year)
+    
+    with metrics.stage('load_years'):
+        return load_concurrently(with_script_ctx(load), years)
+
+# Tablice miejsc (`python rank_tables.py build`) - miejsce to jeden odczyt z tablicy, bez wierszy z wynikami
+@st.cache_resource
+def load_exported_rank_tables() -> Optional[RankTables]:
+    try:
+        return RankTables.load(os.getenv('RANK_TABLES_PATH', DEFAULT_TABLES_PATH))
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Tablice z pliku tylko dla tej samej wersji danych (ETag); rok spoza pliku albo nowsze dane -
+# tablice liczone raz na proces i wersję z danych historycznych
+@st.cache_resource(max_entries=8)
+def load_rank_tables(year: int, version: str) -> Optional[RankTables]:
+    exported = load_exported_rank_tables()
+    if exported is not None and year in exported and exported.source(year) == version:
+        return exported
+    dataset = load_historical_data(year)
+    if dataset is None or dataset.version != version:
+        return None
+    runners = dataset.view()
+    with metrics.stage('build_rank_tables'):
+        return RankTables({year: build_year_arrays(runners.finish_sec, runners.age, runners.gender)}, {year: version})
+
+# Parsowanie danych: najpierw reguły (mikrosekundy), OpenAI tylko gdy reguły nie są pewne
 def parse_runner_data(text: str) -> Dict:
-    client = get_openai_client()
-    
-    prompt = f"""
+    with metrics.stage('parse_rules'):
+        rule_result = extract_runner_data(text)
+    if rule_result is not None:
+        metrics.count('parser_total', path='rules')
+        return {
+            "age": rule_result["age"],
+            "gender": rule_result["gender"],
+            "time_5km_sec": rule_result["time_5km_sec"],
+            "errors": []
+        }
+    return parse_runner_data_with_llm(text)
+
+# Prompt i model parsera - ich zmiana unieważnia wpisy w cache odpowiedzi
+PARSER_MODEL = "gpt-4o-mini"
+PARSER_PROMPT = """
     Przeanalizuj następujący tekst i wyciągnij informacje o biegaczu:
     "{text}"
     
@@ -165,16 +331,37 @@ def parse_runner_data(text: str) -> Dict:
     
     Jeśli nie możesz wyciągnąć jakiejś informacji lub jest nieprawidłowa, dodaj błąd do listy errors.
     """
+
+# Cache odpowiedzi LLM (SQLite) - wspólny dla sesji i procesów
+@st.cache_resource
+def get_llm_cache() -> LLMCache:
+    return LLMCache()
+
+def parse_runner_data_with_llm(text: str) -> Dict:
+    key = cache_key(text, PARSER_PROMPT, PARSER_MODEL)
+    cached = get_llm_cache().get(key)
+    if cached is not None:
+        metrics.count('parser_total', path='llm_cache')
+        return cached
+    
+    metrics.count('parser_total', path='llm')
+    client = get_openai_client()
+    prompt = PARSER_PROMPT.format(text=text)
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=0
-        )
+        # wywołanie OpenAI trafia do śladu Langfuse bieżącego żądania
+        trace_id = metrics.current_trace_id()
+        with metrics.stage('parse_llm'):
+            response = client.chat.completions.create(
+                model=PARSER_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                temperature=0,
+                **({"trace_id": trace_id} if trace_id else {})
+            )
         
         result = json.loads(response.choices[0].message.content)
+        get_llm_cache().put(key, result)
         return result
     except Exception as e:
         return {"errors": [f"Błąd parsowania: {e}"]}
@@ -195,6 +382,23 @@ def create_pace_speed_table():
     
     return pd.DataFrame(paces)
 
+# Rozgrzewanie w tle: model i dane lat ładują się, gdy parser (LLM) jeszcze pracuje
+def warm_predictor():
+    if needs_pycaret():
+        load_prediction_model()
+
+def warm_year(year: int):
+    dataset = fetch_historical_data(year)
+    load_rank_tables(year, dataset.version)
+    # tło wykresu dla domyślnego wyboru "Wszystkimi biegaczami" (przy puli procesów trzymają je procesy robocze)
+    if not process_pool.enabled():
+        load_chart_background(year, dataset.version, None, chart_title(year, None))
+
+def start_warmup():
+    prefetch.start('predictor', with_script_ctx(warm_predictor))
+    for year in RESULT_YEARS:
+        prefetch.start(f'year_{year}', with_script_ctx(warm_year), year)
+
 # STRONA 1: Wprowadzanie danych
 def page_input():
     st.markdown('<div class="main-header">🏃‍♂️ Prognoza czasu w półmaratonie</div>', 
@@ -254,6 +458,11 @@ def page_input():
                 # Dodaj do historii jeśli to nowy wpis
                 if user_input not in st.session_state.data_history:
                     st.session_state.data_history.append(user_input)
+                    st.session_state.data_history, st.session_state.history_index = session_store.bound_history(
+                        st.session_state.data_history, st.session_state.history_index)
+                
+                # Model i dane startują w tle, zanim parser skończy
+                start_warmup()
                 
                 # Parsuj dane
                 with st.spinner("Przetwarzam dane..."):
@@ -340,25 +549,68 @@ def page_summary():
     with col2:
         if st.button("Oszacuj czas w półmaratonie", type="primary"):
             with st.spinner("Ładuję model i generuję prognozę..."):
-                model = load_prediction_model()
+                # Model zwykle jest już załadowany w tle (start_warmup) - dołącz do trwającego ładowania
+                prefetch.join('predictor')
+                
+                # Popularny profil - prognoza (i wyniki z kolejnej strony) już policzone w innej sesji
+                results_key = profile_key(data, predictor_version())
+                payload = get_results_cache().get(results_key)
+                if payload is not None:
+                    st.session_state.prediction = payload.prediction
+                    st.session_state.results_key = results_key
+                    st.session_state.current_page = 'results'
+                    st.rerun()
+                
+                # Kolejno: tablica predykcji, lekki predyktor, pełny potok PyCaret
+                grid = load_prediction_grid()
+                predicted_seconds = None
+                if grid is not None:
+                    with metrics.stage('predict'):
+                        predicted_seconds = grid.lookup(data['gender'], data['age'], data['time_5km_sec'])
+                    if predicted_seconds is not None:
+                        metrics.count('predictions_total', engine='grid')
                 
-                if model is None:
-                    st.error("Nie udało się załadować modelu predykcji.")
-                    return
+                serving_model = None
+                model = None
+                if predicted_seconds is None:
+                    serving_model = load_serving_model()
+                
+                # RENDER_WORKERS > 0: potok PyCaret trzymają rozgrzane procesy robocze (process_pool.py);
+                # po przekroczeniu czasu albo błędzie predykcja liczona jest tutaj
+                if predicted_seconds is None and serving_model is None and process_pool.enabled():
+                    with metrics.stage('predict'):
+                        predicted_seconds = process_pool.predict(data['gender'], data['age'], data['time_5km_sec'])
+                    if predicted_seconds is not None:
+                        metrics.count('predictions_total', engine='worker')
+                
+                if predicted_seconds is None and serving_model is None:
+                    model = load_prediction_model()
+                    
+                    if model is None:
+                        st.error("Nie udało się załadować modelu predykcji.")
+                        return
                 
                 try:
-                    # Przygotuj dane dla modelu
-                    input_data = pd.DataFrame([{
-                        'gender': data['gender'],
-                        'age': data['age'],
-                        '5_km_sec': float(data['time_5km_sec'])
-                    }])
+                    if serving_model is not None:
+                        with metrics.stage('predict'):
+                            predicted_seconds = int(predict_fast(
+                                serving_model, data['gender'], data['age'], float(data['time_5km_sec']))[0])
+                    elif model is not None:
+                        # Przygotuj dane dla modelu
+                        input_data = pd.DataFrame([{
+                            'gender': data['gender'],
+                            'age': data['age'],
+                            '5_km_sec': float(data['time_5km_sec'])
+                        }])
                     
-                    # Wykonaj predykcję
-                    prediction = pcr.predict_model(model, data=input_data)
-                    predicted_seconds = int(prediction['prediction_label'].iloc[0])
+                        # Wykonaj predykcję
+                        with metrics.stage('predict'):
+                            prediction = pcr.predict_model(model, data=input_data)
+                        predicted_seconds = int(prediction['prediction_label'].iloc[0])
                     
+                    get_results_cache().put(results_key, predicted_seconds)
                     st.session_state.prediction = predicted_seconds
+                    st.session_state.results_key = results_key
                     st.session_state.current_page = 'results'
                     st.rerun()
                     
@@ -386,23 +638,120 @@ def page_results():
                 unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
-    # Zakładki z wizualizacjami
-    tab1, tab2 = st.tabs(["Półmaraton Wrocław 2023", "Półmaraton Wrocław 2024"])
+    # Zakładki z wizualizacjami - liczy się tylko otwarta zakładka (on_change="rerun" + tab.open),
+    # a jej dane ładują się przed rysowaniem (pozostałe lata rozgrzewa prefetch)
+    years = RESULT_YEARS
+    tabs = st.tabs([f"Półmaraton Wrocław {year}" for year in years], key="results_tabs", on_change="rerun")
+    open_years = [year for tab, year in zip(tabs, years) if tab.open]
+    loaded = load_years_concurrently(open_years)
     
-    for tab, year in zip([tab1, tab2], [2023, 2024]):
+    for tab, year in zip(tabs, years):
+        if year not in loaded:
+            continue
         with tab:
-            create_visualization(year)
+            result = loaded[year]
+            if result.timed_out:
+                st.warning(f"Dane dla roku {year} ładują się zbyt długo - odśwież stronę za chwilę.")
+            elif result.error is not None:
+                st.error(f"Błąd ładowania danych historycznych dla roku {year}: {result.error}")
+            else:
+                year_tab(year)
     
     # Przycisk powrotu
     if st.button("← Powrót do strony głównej"):
         st.session_state.current_page = 'input'
         st.session_state.prediction = None
+        st.session_state.results_key = None
         st.rerun()
 
+POINTS_CHART = "Punkty (obraz)"
+DENSITY_CHART = "Gęstość (interaktywny)"
+
+def chart_title(year: int, gender: Optional[str]) -> str:
+    if gender is None:
+        return f'Półmaraton Wrocław {year} (wszyscy biegacze)'
+    return f"Półmaraton Wrocław {year} (płeć: {'mężczyźni' if gender == 'M' else 'kobiety'})"
+
+# Tło wykresu jako PNG - raz na proces dla roku, wersji danych i filtra płci
+# (None, gdy dane zmieniły się od wywołania - wywołujący rysuje tło ze swojej wersji)
+@st.cache_resource(max_entries=16)
+def load_chart_background(year: int, version: str, gender: Optional[str], title: str) -> Optional[ChartBackground]:
+    dataset = load_historical_data(year)
+    if dataset is None or dataset.version != version:
+        return None
+    runners = dataset.view(gender)
+    if len(runners) == 0:
+        return None
+    with metrics.stage('render_background'):
+        return render_background(runners.age, runners.finish_sec / 3600, title)
+
+# Agregaty gęstości i percentyli jako gotowa specyfikacja Vega-Lite - raz na proces dla roku, wersji danych i filtra płci
+@st.cache_resource(max_entries=16)
+def load_density_spec(year: int, version: str, gender: Optional[str], title: str) -> Optional[Dict]:
+    dataset = load_historical_data(year)
+    if dataset is None or dataset.version != version:
+        return None
+    runners = dataset.view(gender)
+    if len(runners) == 0:
+        return None
+    with metrics.stage('build_density'):
+        return density_spec(build_density(runners.age, runners.finish_sec), title)
+
+# Zakładka roku jako fragment - zmiana filtra płci przelicza tylko tę zakładkę, a nie całą stronę
+@st.fragment
+def year_tab(year: int):
+    # ponowny przebieg samego fragmentu nie przechodzi przez main() - osobne żądanie w metrykach
+    if metrics.current_trace_id() is None:
+        with metrics.request('results_tab'):
+            create_visualization(year)
+    else:
+        create_visualization(year)
+
+def compute_year_result(year: int, dataset: ResultsDataset, rank_gender: Optional[str]) -> Optional[YearResult]:
+    """Wykres i szacowane miejsce dla roku i filtra płci; None gdy brak biegaczy w grupie"""
+    # Filtr płci to wycinek wspólnego zbioru (widok), bez kopiowania danych
+    runners = dataset.view(rank_gender)
+    if len(runners) == 0:
+        return None
+    
+    # Wykres: tło (wszyscy biegacze) renderowane raz na rok i filtr, per żądanie tylko gwiazdka
+    title = chart_title(year, rank_gender)
+    user_age = st.session_state.runner_data['age']
+    user_time_hours = st.session_state.prediction / 3600
+    
+    # RENDER_WORKERS > 0: rysuje rozgrzany proces roboczy (process_pool.py) - wątek skryptu nie trzyma GIL;
+    # po przekroczeniu czasu albo błędzie wykres powstaje tutaj
+    chart_png = None
+    if process_pool.enabled():
+        with metrics.stage('render_worker'):
+            chart_png = process_pool.render_chart(year, dataset.version, rank_gender, title,
+                                                   user_age, user_time_hours)
+    if chart_png is None:
+        background = load_chart_background(year, dataset.version, rank_gender, title)
+        if background is None:
+            with metrics.stage('render_background'):
+                background = render_background(runners.age, runners.finish_sec / 3600, title)
+        with metrics.stage('composite_marker'):
+            chart_png = composite_marker(background, user_age, user_time_hours)
+
+    return YearResult(*estimate_place(year, dataset.version, runners, rank_gender), chart_png)
+
+def estimate_place(year: int, version: str, runners: ResultsView, rank_gender: Optional[str]) -> Tuple[int, int, float]:
+    """Szacowane miejsce, liczba biegaczy i percentyl prognozy w danym roku (wersji danych `version`)"""
+    # odczyt z tablicy skumulowanych liczności zamiast skanu całej ramki
+    rank_tables = load_rank_tables(year, version)
+    if rank_tables is not None:
+        with metrics.stage('rank'):
+            return rank_tables.place(year, st.session_state.prediction, gender=rank_gender)
+    better_runners = int((runners.finish_sec < st.session_state.prediction).sum())
+    total_runners = len(runners)
+    return better_runners + 1, total_runners, (1 - better_runners / total_runners) * 100
+
 def create_visualization(year: int):
-    df = load_historical_data(year)
+    with metrics.stage('load_historical_data'):
+        dataset = load_historical_data(year)
     
-    if df is None:
+    if dataset is None:
         st.error(f"Nie udało się załadować danych dla roku {year}")
         return
     
@@ -413,99 +762,98 @@ def create_visualization(year: int):
         key=f"radio_{year}"
     )
     
-    # Filtruj dane jeśli potrzeba
     if show_all == "Biegaczami tej samej płci":
-        user_gender = st.session_state.runner_data['gender']
-        df_filtered = df[df['gender'] == user_gender].copy()
-        title_suffix = f" (płeć: {'mężczyźni' if user_gender == 'M' else 'kobiety'})"
+        rank_gender = st.session_state.runner_data['gender']
     else:
-        df_filtered = df.copy()
-        title_suffix = " (wszyscy biegacze)"
-    
-    # Konwersja czasu na sekundy jeśli potrzeba
-    if 'finish_sec' not in df_filtered.columns:
-        # Assumujemy że jest kolumna z czasem w formacie tekstowym
-        time_columns = [col for col in df_filtered.columns if 'time' in col.lower() or 'czas' in col.lower()]
-        if time_columns:
-            try:
-                df_filtered['finish_sec'] = df_filtered[time_columns[0]].apply(
-                    lambda x: time_to_seconds(str(x)) if pd.notna(x) else None
-                )
-            except:
-                st.error("Problem z konwersją czasów w danych historycznych")
-                return
-    
-    # Sprawdź czy mamy potrzebne kolumny
-    required_cols = ['age', 'finish_sec']
-    missing_cols = [col for col in required_cols if col not in df_filtered.columns]
-    if missing_cols:
-        st.error(f"Brakuje kolumn w danych: {missing_cols}")
-        return
-    
-    # Usuń wiersze z brakującymi danymi
-    df_filtered = df_filtered.dropna(subset=['age', 'finish_sec'])
-    
-    if len(df_filtered) == 0:
-        st.warning("Brak danych do wyświetlenia")
-        return
-    
-    # Stwórz wykres
-    fig, ax = plt.subplots(figsize=(12, 8))
-    
-    # Wykres rozrzutu dla danych historycznych
-    scatter = ax.scatter(df_filtered['age'], df_filtered['finish_sec'] / 3600, 
-                        alpha=0.6, s=30, color='lightblue', label='Uczestnicy historyczni')
-    
-    # Dodaj punkt dla aktualnego biegacza
-    user_age = st.session_state.runner_data['age']
-    user_time_hours = st.session_state.prediction / 3600
-    
-    ax.scatter(user_age, user_time_hours, 
-              color='red', s=200, marker='*', 
-              label='Twoja prognoza', zorder=5, edgecolor='darkred', linewidth=2)
-    
-    # Formatowanie wykresu
-    ax.set_xlabel('Wiek', fontsize=12)
-    ax.set_ylabel('Czas (godziny)', fontsize=12)
-    ax.set_title(f'Półmaraton Wrocław {year}{title_suffix}', fontsize=14, fontweight='bold')
-    ax.grid(True, alpha=0.3)
-    ax.legend()
-    
-    # Ustaw limity osi Y dla lepszej czytelności
-    y_min = max(1.0, df_filtered['finish_sec'].min() / 3600 - 0.1)
-    y_max = min(4.0, df_filtered['finish_sec'].max() / 3600 + 0.1)
-    ax.set_ylim(y_min, y_max)
-    
-    st.pyplot(fig)
-    plt.close()
+        rank_gender = None
+    
+    # Obraz z punktami wszystkich biegaczy albo gęstość rysowana w przeglądarce (density_chart.py) -
+    # do przeglądarki idą tylko agregaty, niezależnie od liczby biegaczy
+    chart_mode = st.radio(
+        "Wykres:",
+        [POINTS_CHART, DENSITY_CHART],
+        key=f"chart_mode_{year}",
+        horizontal=True
+    )
     
-    # Oblicz szacowane miejsce
-    better_runners = len(df_filtered[df_filtered['finish_sec'] < st.session_state.prediction])
-    total_runners = len(df_filtered)
-    estimated_place = better_runners + 1
+    if chart_mode == DENSITY_CHART:
+        runners = dataset.view(rank_gender)
+        spec = load_density_spec(year, dataset.version, rank_gender, chart_title(year, rank_gender))
+        if spec is None or len(runners) == 0:
+            st.warning("Brak danych do wyświetlenia")
+            return
+        place, total, percentile = estimate_place(year, dataset.version, runners, rank_gender)
+        st.vega_lite_chart(with_prediction(spec, st.session_state.runner_data['age'],
+                                           st.session_state.prediction / 3600),
+                           width="stretch")
+        st.caption("Kolor: liczba biegaczy w komórce wiek × czas; pas: 10.-90. percentyl czasu dla rocznika; "
+                   "linia: mediana.")
+    else:
+        # Gotowy wynik roku dla tego profilu (results_cache.py) - inaczej wykres i ranking liczone teraz
+        results_key = st.session_state.results_key
+        year_key = (year, rank_gender, dataset.version)
+        result = get_results_cache().get_year(results_key, year_key) if results_key else None
+        if result is None:
+            result = compute_year_result(year, dataset, rank_gender)
+            if result is None:
+                st.warning("Brak danych do wyświetlenia")
+                return
+            if results_key:
+                get_results_cache().put_year(results_key, year_key, result)
+        place, total, percentile = result.place, result.total, result.percentile
+        
+        st.image(result.chart_png, width="stretch")
     
     st.markdown('<div class="result-box">', unsafe_allow_html=True)
     st.subheader(f"Szacowane miejsce w roku {year}:")
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Miejsce", f"{estimated_place}")
+        st.metric("Miejsce", f"{place}")
     with col2:
-        st.metric("Na", f"{total_runners}")
+        st.metric("Na", f"{total}")
     with col3:
-        percentile = (1 - better_runners / total_runners) * 100
         st.metric("Percentyl", f"{percentile:.1f}%")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+# Import ciężkich modułów w tle - raz na proces, po wyrenderowaniu pierwszej strony
+@st.cache_resource
+def start_background_imports():
+    # PyCaret (kilka sekund importu, setki MB) tylko w procesie, który będzie z niego korzystał
+    return preload_in_background([name for name in HEAVY_MODULES
+                                  if name != 'pycaret.regression' or needs_pycaret()])
+
+# Pula procesów do rysowania wykresów i predykcji PyCaret (RENDER_WORKERS) - raz na proces, po pierwszym renderze
+@st.cache_resource
+def start_render_workers():
+    return process_pool.start(RESULT_YEARS, preload_model=needs_pycaret())
+
+# Serwer /metrics (Prometheus) - raz na proces, gdy ustawiono METRICS_PORT
+@st.cache_resource
+def start_metrics_server():
+    return metrics.start_http_server()
+
 # Nawigacja główna
 def main():
-    if st.session_state.current_page == 'input':
-        page_input()
-    elif st.session_state.current_page == 'summary':
-        page_summary()
-    elif st.session_state.current_page == 'results':
-        page_results()
+    start_metrics_server()
+    page = st.session_state.current_page
+    
+    # Jedno przejście skryptu = jedno żądanie z rozbiciem czasu na etapy
+    try:
+        with metrics.request(page):
+            if page == 'input':
+                page_input()
+            elif page == 'summary':
+                page_summary()
+            elif page == 'results':
+                page_results()
+    finally:
+        # także przy st.rerun() - zmiany stanu trafiają do magazynu przed kolejnym przebiegiem
+        persist_session()
+    
+    start_background_imports()
+    start_render_workers()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,196 @@
+# batch_predict.py
+"""Wsadowa predykcja czasu półmaratonu dla listy zawodników (np. listy zgłoszeń).
+
+Wejście: CSV (sep=';') lub Parquet z kolumnami gender (M/F/K), age, 5_km_sec.
+Wyjście: te same wiersze oraz finish_sec (przewidywany czas w sekundach) i dla każdego
+roku miejsce i percentyl wśród wszystkich biegaczy oraz wśród biegaczy tej samej płci -
+tak samo jak na stronie wyników aplikacji. Wiersze spoza dziedziny aplikacji (płeć inna
+niż M/K, wiek poza 18-105, czas na 5 km poza 15-120 min) nie są oceniane: mają puste
+kolumny wyniku i powód w kolumnie error. Wynik jest zapisywany porcja po porcji.
+W Parquet każda porcja ma ten sam schemat (wiek i czas float64, wyniki Int64, error string) -
+wiek czy czas, który nie jest liczbą, jest tam pusty, a powód zostaje w kolumnie error.
+
+Użycie:
+    python batch_predict.py zgloszenia.csv --out prognozy.csv [--years 2023 2024] [--s3]
+"""
+import argparse
+import os
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rank_tables import RankTables, load_frames
+from rule_parser import AGE_RANGE, TIME_5KM_RANGE
+from serving_model import DEFAULT_ARTIFACT_PATH, DEFAULT_MODEL_PATH, ServingModel, predict_fast
+
+INPUT_COLUMNS = ['gender', 'age', '5_km_sec']
+GENDER_ALIASES = {'M': 'M', 'F': 'F', 'K': 'F'}
+
+
+def read_input(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from pd.read_csv(path, sep=';', chunksize=chunksize)
+
+
+def predict_chunk(chunk: pd.DataFrame, model: Optional[ServingModel], pipeline=None) -> np.ndarray:
+    """Przewidywany czas (pełne sekundy, jak w aplikacji) dla porcji wierszy"""
+    if model is not None:
+        predicted = predict_fast(model, chunk['gender'].to_numpy(), chunk['age'].to_numpy(),
+                                 chunk['5_km_sec'].to_numpy(dtype=np.float64))
+    else:
+        import pycaret.regression as pcr
+        predicted = pcr.predict_model(pipeline, data=chunk[INPUT_COLUMNS], verbose=False)['prediction_label'].to_numpy()
+    return predicted.astype(np.int64)
+
+
+def validate_chunk(chunk: pd.DataFrame) -> pd.Series:
+    """Powód odrzucenia wiersza ('' dla poprawnych) - te same granice co walidacja w aplikacji"""
+    age = pd.to_numeric(chunk['age'], errors='coerce')
+    time_5km = pd.to_numeric(chunk['5_km_sec'], errors='coerce')
+    errors = pd.Series('', index=chunk.index, dtype=object)
+    checks = [
+        (chunk['gender'].isna(), "płeć musi być M albo K/F"),
+        (~age.between(*AGE_RANGE) | (age % 1 != 0), f"wiek musi być liczbą całkowitą {AGE_RANGE[0]}-{AGE_RANGE[1]}"),
+        (~time_5km.between(*TIME_5KM_RANGE), f"czas na 5 km musi być między {TIME_5KM_RANGE[0]} a {TIME_5KM_RANGE[1]} s"),
+    ]
+    # sprawdzane w odwrotnej kolejności - w kolumnie zostaje pierwszy błąd wiersza
+    for mask, reason in reversed(checks):
+        errors[mask] = reason
+    return errors
+
+
+def score_chunk(chunk: pd.DataFrame, rank_tables: RankTables,
+                model: Optional[ServingModel], pipeline=None) -> pd.DataFrame:
+    """Porcja z kolumnami wyniku; wiersze spoza dziedziny mają puste wyniki i powód w kolumnie error"""
+    missing = [col for col in INPUT_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Brakuje kolumn w danych wejściowych: {missing}")
+
+    chunk = chunk.copy()
+    gender = chunk['gender'].astype(str).str.strip().str.upper().map(GENDER_ALIASES)
+    # nierozpoznana płeć zostaje w wyniku w oryginalnej postaci - widać, co trzeba poprawić
+    chunk['gender'] = gender.where(gender.notna(), chunk['gender'])
+    errors = validate_chunk(chunk.assign(gender=gender))
+    valid = errors == ''
+    valid_rows = chunk[valid].assign(age=pd.to_numeric(chunk['age'][valid]).astype(np.int64),
+                                     **{'5_km_sec': pd.to_numeric(chunk['5_km_sec'][valid]).astype(np.float64)})
+    scored = _score_valid(valid_rows, rank_tables, model, pipeline)
+
+    for column in scored.columns.difference(chunk.columns, sort=False):
+        values = scored[column].reindex(chunk.index)
+        chunk[column] = values if column.startswith('percentile') else values.astype('Int64')
+    chunk['error'] = errors
+    return chunk
+
+
+def _score_valid(chunk: pd.DataFrame, rank_tables: RankTables,
+                 model: Optional[ServingModel], pipeline=None) -> pd.DataFrame:
+    if len(chunk) == 0:
+        finish_sec = np.zeros(0, dtype=np.int64)
+    else:
+        finish_sec = predict_chunk(chunk, model, pipeline)
+    chunk['finish_sec'] = finish_sec
+
+    # te same tablice miejsc co w aplikacji (rank_tables.py) - miejsca wsadowe i na stronie się zgadzają
+    for year in rank_tables.years:
+        place, total, percentile = rank_tables.place_many(year, finish_sec)
+        chunk[f'place_{year}'] = place
+        chunk[f'total_{year}'] = total
+        chunk[f'percentile_{year}'] = percentile.round(1)
+
+        gender_place = np.zeros(len(chunk), dtype=np.int64)
+        gender_total = np.zeros(len(chunk), dtype=np.int64)
+        gender_percentile = np.full(len(chunk), np.nan)
+        genders = chunk['gender'].to_numpy()
+        for gender in ('M', 'F'):
+            mask = genders == gender
+            if mask.any():
+                gender_place[mask], gender_total[mask], gender_percentile[mask] = \
+                    rank_tables.place_many(year, finish_sec[mask], gender=gender)
+        chunk[f'place_{year}_gender'] = gender_place
+        chunk[f'total_{year}_gender'] = gender_total
+        chunk[f'percentile_{year}_gender'] = gender_percentile.round(1)
+    return chunk
+
+
+def _output_dtype(column: str) -> Optional[str]:
+    """Stały typ kolumny wyniku - taki sam w każdej porcji, niezależnie od jej zawartości"""
+    if column in ('age', '5_km_sec') or column.startswith('percentile'):
+        return 'float64'
+    if column in ('gender', 'error'):
+        return 'string'
+    if column == 'finish_sec' or column.startswith(('place_', 'total_')):
+        return 'Int64'
+    return None
+
+
+def to_arrow(scored: pd.DataFrame, schema=None):
+    """Porcja wyniku jako tabela Arrow o stałym schemacie (wiek czy czas niebędące liczbą -> null)"""
+    import pyarrow as pa
+
+    scored = scored.copy()
+    for column in scored.columns:
+        dtype = _output_dtype(column)
+        if dtype == 'float64':
+            scored[column] = pd.to_numeric(scored[column], errors='coerce').astype(np.float64)
+        elif dtype is not None:
+            scored[column] = scored[column].astype(dtype)
+    return pa.Table.from_pandas(scored, schema=schema, preserve_index=False)
+
+
+def run(input_path: str, out_path: str, years: List[int], chunksize: int = 50_000,
+        use_s3: bool = False, artifact_path: str = DEFAULT_ARTIFACT_PATH) -> Tuple[int, int]:
+    """Ocenia plik wejściowy porcjami, dopisując każdą porcję do wyniku; zwraca (wiersze, odrzucone)"""
+    rank_tables = RankTables.from_frames(*load_frames(years, use_s3))
+    model, pipeline = None, None
+    if os.path.exists(artifact_path):
+        model = ServingModel.load(artifact_path)
+    else:
+        import pycaret.regression as pcr
+        pipeline = pcr.load_model(DEFAULT_MODEL_PATH, verbose=False)
+
+    rows, rejected = 0, 0
+    writer = None
+    try:
+        for chunk in read_input(input_path, chunksize):
+            scored = score_chunk(chunk, rank_tables, model, pipeline)
+            if out_path.endswith('.parquet'):
+                import pyarrow.parquet as pq
+                # schemat pierwszej porcji obowiązuje wszystkie kolejne - typy kolumn wyniku są stałe
+                table = to_arrow(scored, writer.schema if writer is not None else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            else:
+                scored.to_csv(out_path, sep=';', index=False, mode='w' if rows == 0 else 'a', header=rows == 0)
+            rows += len(scored)
+            rejected += int((scored['error'] != '').sum())
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows, rejected
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="plik CSV (sep=';') lub .parquet z kolumnami gender, age, 5_km_sec")
+    parser.add_argument('--out', required=True, help="plik wynikowy .csv lub .parquet")
+    parser.add_argument('--years', type=int, nargs='+', default=[2023, 2024])
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--s3', action='store_true', help="dane historyczne z S3 zamiast data/current")
+    parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_PATH, help="artefakt z serving_model.py export")
+    args = parser.parse_args(argv)
+
+    rows, rejected = run(args.input, args.out, args.years, args.chunksize, args.s3, args.artifact)
+    print(f"Zapisano {rows} wierszy do {args.out} (bez prognozy: {rejected}, powód w kolumnie error)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
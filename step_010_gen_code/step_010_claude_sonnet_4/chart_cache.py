@@ -0,0 +1,152 @@
+# chart_cache.py
+"""Wykres wyników: statyczne tło renderowane raz, gwiazdka użytkownika dorysowywana per żądanie.
+
+Tło (wszyscy biegacze danego roku i filtra płci) jest rasteryzowane przez matplotlib
+jeden raz i trzymane jako PNG razem z położeniem osi w pikselach. Dla konkretnego
+biegacza na kopię obrazu nanoszona jest tylko czerwona gwiazdka (Pillow), bez
+ponownego rysowania ~10 tys. punktów.
+
+Oś wieku obejmuje całą dziedzinę wejścia aplikacji (rule_parser.AGE_RANGE), a nie tylko
+wiek biegaczy z danych - gwiazdka jest widoczna dla każdego poprawnego wieku. Prognozy
+poza zakresem osi czasu nie przesuwamy na wykres: na krawędzi osi rysowana jest strzałka
+skierowana na zewnątrz z etykietą podającą rzeczywisty czas. Legenda stoi w prawym dolnym
+rogu, z dala od górnej krawędzi, na której lądują prognozy wolniejsze niż skala.
+"""
+import io
+import math
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+from rule_parser import AGE_RANGE
+
+MARKER_SIZE = 200  # pole markera w pt^2, jak w ax.scatter(..., s=200)
+MARKER_COLOR = (255, 0, 0, 255)
+MARKER_EDGE = (139, 0, 0, 255)
+
+
+@dataclass(frozen=True)
+class ChartBackground:
+    png: bytes
+    dpi: float
+    axes_px: Tuple[float, float, float, float]  # lewo, góra, prawo, dół (piksele obrazu)
+    xlim: Tuple[float, float]
+    ylim: Tuple[float, float]
+
+    def to_pixels(self, x: float, y: float) -> Tuple[float, float]:
+        left, top, right, bottom = self.axes_px
+        px = left + (x - self.xlim[0]) / (self.xlim[1] - self.xlim[0]) * (right - left)
+        py = bottom - (y - self.ylim[0]) / (self.ylim[1] - self.ylim[0]) * (bottom - top)
+        return px, py
+
+
+def render_background(ages: np.ndarray, times_hours: np.ndarray, title: str,
+                      figsize=(12, 8), dpi: float = 100) -> ChartBackground:
+    """Rysuje tło wykresu (bez gwiazdki użytkownika) i zapamiętuje geometrię osi"""
+    # Figure bez pyplot - brak globalnego stanu, można renderować w wielu wątkach
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.scatter(ages, times_hours, alpha=0.6, s=30, color='lightblue', label='Uczestnicy historyczni')
+    # pusty marker tylko dla legendy - właściwa gwiazdka jest dorysowywana później
+    ax.scatter([], [], color='red', s=MARKER_SIZE, marker='*',
+               label='Twoja prognoza', edgecolor='darkred', linewidth=2)
+
+    ax.set_xlabel('Wiek', fontsize=12)
+    ax.set_ylabel('Czas (godziny)', fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc='lower right')
+
+    ax.set_xlim(min(AGE_RANGE[0], float(np.min(ages))) - 2, AGE_RANGE[1] + 2)
+    y_min = max(1.0, float(np.min(times_hours)) - 0.1)
+    y_max = min(4.0, float(np.max(times_hours)) + 0.1)
+    ax.set_ylim(y_min, y_max)
+
+    fig.tight_layout()
+    fig.canvas.draw()
+    height = fig.bbox.height
+    (x0, y0), (x1, y1) = ax.get_window_extent().get_points()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi)
+    return ChartBackground(
+        png=buf.getvalue(),
+        dpi=dpi,
+        axes_px=(x0, height - y1, x1, height - y0),
+        xlim=tuple(ax.get_xlim()),
+        ylim=tuple(ax.get_ylim()),
+    )
+
+
+def _star_points(cx: float, cy: float, outer: float, inner_ratio: float = 0.381966):
+    points = []
+    for i in range(10):
+        radius = outer if i % 2 == 0 else outer * inner_ratio
+        angle = math.pi / 2 + i * math.pi / 5
+        points.append((cx + radius * math.cos(angle), cy - radius * math.sin(angle)))
+    return points
+
+
+def _arrow_points(px: float, py: float, size: float, dx: int, dy: int):
+    """Trójkąt z wierzchołkiem w (px, py), skierowany w stronę (dx, dy)"""
+    length = math.hypot(dx, dy)
+    ux, uy = dx / length, dy / length
+    bx, by = px - ux * size * 1.5, py - uy * size * 1.5
+    return [(px, py), (bx - uy * size, by + ux * size), (bx + uy * size, by - ux * size)]
+
+
+def _off_scale_label(x: float, y: float, off_x: int) -> str:
+    minutes = round(y * 60)
+    parts = [f'{minutes // 60}:{minutes % 60:02d} h']
+    if off_x:
+        parts.append(f'wiek {x:g}')
+    return 'Twoja prognoza: ' + ', '.join(parts) + ' (poza skalą)'
+
+
+def composite_marker(background: ChartBackground, x: float, y: float) -> bytes:
+    """PNG tła z gwiazdką w punkcie (x, y) w jednostkach danych; punkt spoza osi - strzałka z etykietą"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    image = Image.open(io.BytesIO(background.png)).convert('RGBA')
+    left, top, right, bottom = background.axes_px
+    px, py = background.to_pixels(x, y)
+    # kierunek wyjścia poza osie w pikselach obrazu (oś y rośnie w dół)
+    off_x = -1 if px < left else 1 if px > right else 0
+    off_y = -1 if py < top else 1 if py > bottom else 0
+
+    # średnica markera matplotlib to sqrt(s) punktów
+    outer = math.sqrt(MARKER_SIZE) * background.dpi / 72 * 0.6
+    width = max(1, round(2 * background.dpi / 72))
+    draw = ImageDraw.Draw(image)
+    if not (off_x or off_y):
+        draw.polygon(_star_points(px, py, outer), fill=MARKER_COLOR, outline=MARKER_EDGE, width=width)
+    else:
+        # wierzchołek strzałki na krawędzi osi, w miejscu gdzie prognoza opuszcza wykres
+        tip_x, tip_y = min(max(px, left), right), min(max(py, top), bottom)
+        size = outer * 0.8
+        draw.polygon(_arrow_points(tip_x, tip_y, size, off_x, off_y), fill=MARKER_COLOR,
+                     outline=MARKER_EDGE, width=width)
+
+        # ten sam krój co reszta wykresu (DejaVu Sans z matplotlib), z polskimi znakami
+        from matplotlib import font_manager
+        font = ImageFont.truetype(font_manager.findfont('DejaVu Sans'), round(11 * background.dpi / 72))
+        label = _off_scale_label(x, y, off_x)
+        text_w = draw.textlength(label, font=font)
+        gap = size * 1.5
+        # etykieta obok strzałki, po stronie bliżej środka wykresu, w całości wewnątrz osi
+        base_x, base_y = tip_x - off_x * size * 1.5, tip_y - off_y * size * 1.5
+        if base_x + gap + text_w <= right:
+            text_x = base_x + gap
+        else:
+            text_x = max(left, base_x - gap - text_w)
+        text_y = min(max(base_y, top + gap), bottom - gap)
+        draw.text((text_x, text_y), label, font=font, fill=MARKER_EDGE, anchor='lm')
+
+    buf = io.BytesIO()
+    image.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
@@ -0,0 +1,70 @@
+# concurrent_loader.py
+"""Równoległe ładowanie wielu zasobów (np. danych historycznych kilku lat) na wspólnej, ograniczonej puli wątków.
+
+Na zimnym cache czas strony wyników to czas najwolniejszego roku, a nie suma.
+Każdy klucz ma własny wynik: wartość, błąd albo przekroczenie czasu - strona może
+wyświetlić lata, które się załadowały, i komunikat dla pozostałych. Zadanie, które
+przekroczyło czas, pracuje dalej w tle i zasila cache na następne przejście.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+MAX_WORKERS = int(os.getenv('LOADER_MAX_WORKERS', '4'))
+DEFAULT_TIMEOUT = float(os.getenv('LOADER_TIMEOUT_SECONDS', '30'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Jedna pula na proces - liczba wątków nie rośnie z liczbą sesji"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='loader')
+        return _executor
+
+
+@dataclass
+class LoadResult:
+    value: Any = None
+    error: Optional[BaseException] = None
+    timed_out: bool = False
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+def load_concurrently(loader: Callable[[Hashable], Any], keys: Iterable[Hashable],
+                      timeout: float = DEFAULT_TIMEOUT) -> Dict[Hashable, LoadResult]:
+    """Wywołuje loader(key) dla wszystkich kluczy równolegle; czeka na każdy klucz najwyżej timeout sekund"""
+    keys = list(dict.fromkeys(keys))
+    start = time.perf_counter()
+    finished_at: Dict[Hashable, float] = {}
+
+    def run(key):
+        try:
+            return loader(key)
+        finally:
+            finished_at[key] = time.perf_counter()
+
+    executor = get_executor()
+    futures: Dict[Future, Hashable] = {executor.submit(run, key): key for key in keys}
+    # termin liczony od zlecenia - wszystkie klucze zlecane razem, więc to limit na każdy z nich
+    _, pending = wait(futures, timeout=timeout)
+
+    results: Dict[Hashable, LoadResult] = {}
+    for future, key in futures.items():
+        if future in pending:
+            results[key] = LoadResult(timed_out=True, seconds=timeout)
+            continue
+        seconds = finished_at.get(key, time.perf_counter()) - start
+        error = future.exception()
+        results[key] = LoadResult(value=None if error else future.result(), error=error, seconds=seconds)
+    return {key: results[key] for key in keys}
@@ -0,0 +1,95 @@
+# dataset_cache.py
+"""Lokalny, kolumnowy (Feather) cache wyników historycznych z magazynu (S3 albo katalog lokalny).
+
+Plik cache jest kluczowany ETagiem obiektu S3, więc zmiana pliku w S3 daje nowy
+wpis, a niezmieniony plik nie jest ponownie pobierany ani parsowany z CSV.
+Feather bez kompresji jest czytany przez memory-map - kolumny liczbowe nie są kopiowane.
+"""
+import io
+import os
+import re
+import tempfile
+from typing import Optional
+
+import pandas as pd
+
+import metrics
+
+CACHE_DIR = os.getenv('HALFMARATHON_CACHE_DIR',
+                      os.path.join(os.path.expanduser('~'), '.cache', 'halfmarathon'))
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Zwarte typy kolumn: sekundy int32, wiek int8, płeć kategoryczna"""
+    df = df.copy()
+    for col in ('finish_sec', '5_km_sec', 'Miejsce'):
+        if col in df.columns:
+            if df[col].notna().all():
+                df[col] = df[col].astype('int32')
+            else:
+                df[col] = df[col].astype('float32')
+    if 'age' in df.columns:
+        df['age'] = df['age'].astype('int8' if df['age'].notna().all() else 'float32')
+    if 'gender' in df.columns:
+        df['gender'] = df['gender'].astype('category')
+    return df
+
+
+def cache_path(key: str, etag: str, cache_dir: str = CACHE_DIR) -> str:
+    stem = os.path.splitext(os.path.basename(key))[0]
+    return os.path.join(cache_dir, f"{stem}.{re.sub(r'[^0-9A-Za-z-]', '', etag)}.feather")
+
+
+def read_cached(path: str) -> Optional[pd.DataFrame]:
+    """Czyta plik Feather przez memory-map; None gdy pliku nie ma"""
+    if not os.path.exists(path):
+        return None
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def write_cached(df: pd.DataFrame, path: str) -> None:
+    """Zapis atomowy (plik tymczasowy + rename) - inne procesy nie zobaczą niepełnego pliku"""
+    import pyarrow.feather as feather
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        # bez kompresji - tylko taki plik da się zmapować w pamięci bez kopiowania
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    # usuń wcześniejsze wersje tego samego pliku
+    stem = os.path.basename(path).split('.', 1)[0]
+    for name in os.listdir(os.path.dirname(path)):
+        other = os.path.join(os.path.dirname(path), name)
+        if name.startswith(f"{stem}.") and name.endswith('.feather') and other != path:
+            try:
+                os.unlink(other)
+            except OSError:
+                pass
+
+
+def load_results_frame(store, key: str, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Wyniki historyczne z magazynu (storage.py): z lokalnego cache dla bieżącego ETagu, inaczej parsowanie CSV i zapis do cache"""
+    info = store.head(key)
+    path = cache_path(key, info.etag, cache_dir)
+
+    with metrics.stage('cache_read'):
+        df = read_cached(path)
+    if df is not None:
+        metrics.count('dataset_cache_total', result='hit')
+        return df
+
+    metrics.count('dataset_cache_total', result='miss')
+    data = store.read(key)
+    with metrics.stage('read_csv'):
+        df = compact_dtypes(pd.read_csv(io.BytesIO(data), sep=';'))
+    write_cached(df, path)
+    return df
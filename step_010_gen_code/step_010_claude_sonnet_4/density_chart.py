@@ -0,0 +1,169 @@
+# density_chart.py
+"""Wykres gęstości wyników rysowany w przeglądarce (Vega-Lite) zamiast obrazu z matplotlib.
+
+Zamiast punktu dla każdego biegacza (~10 tys. na rok) do przeglądarki trafiają tylko
+agregaty liczone raz na rok i filtr płci:
+- siatka gęstości: liczba biegaczy w komórkach wiek × czas (AGE_BIN lat × TIME_BIN_MINUTES minut),
+- pas percentyli: p10 / p50 / p90 czasu ukończenia dla każdego rocznika wieku
+  (roczniki z mniej niż MIN_BAND_RUNNERS biegaczami są pomijane).
+
+Rozmiar danych i koszt po stronie serwera zależą od liczby komórek i roczników, a nie od
+liczby biegaczy - tak samo dla jednego roku, jak i dla wielu lat czy biegów. Per żądanie
+do gotowej specyfikacji dokładana jest tylko gwiazdka z prognozą użytkownika:
+
+    summary = build_density(runners.age, runners.finish_sec)
+    spec = with_prediction(density_spec(summary, title), age, predicted_sec / 3600)
+    st.vega_lite_chart(spec, width="stretch")
+
+Oś wieku obejmuje całą dziedzinę wejścia aplikacji (rule_parser.AGE_RANGE), a oś czasu
+jest poszerzana o prognozę użytkownika - gwiazdka jest zawsze widoczna.
+"""
+import copy
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rule_parser import AGE_RANGE
+
+AGE_BIN = 2
+# krawędzie komórek wieku: o jedną komórkę poniżej dziedziny (w danych zdarzają się 17-latkowie)
+AGE_EDGES = (AGE_RANGE[0] - AGE_BIN, AGE_RANGE[1] + 1)
+TIME_RANGE_HOURS = (1.0, 4.0)
+TIME_BIN_MINUTES = 5
+MIN_BAND_RUNNERS = 20
+# gwiazdka jako ścieżka SVG (Vega-Lite nie ma wbudowanego kształtu gwiazdy)
+STAR_SHAPE = ('M0,-1L0.2245,-0.309L0.9511,-0.309L0.3633,0.118L0.5878,0.809'
+              'L0,0.382L-0.5878,0.809L-0.3633,0.118L-0.9511,-0.309L-0.2245,-0.309Z')
+
+
+@dataclass(frozen=True)
+class DensitySummary:
+    cells: pd.DataFrame     # age, age_end, time, time_end (godziny), count - tylko niepuste komórki
+    bands: pd.DataFrame     # age, p10, p50, p90 (godziny)
+    total: int
+    time_domain: Tuple[float, float]  # zakres osi czasu (godziny), jak w wykresie z matplotlib
+
+
+def build_density(ages: np.ndarray, finish_sec: np.ndarray) -> DensitySummary:
+    """Agregaty dla jednego roku i filtra płci - jeden przebieg po kolumnach"""
+    ages = np.asarray(ages, dtype=np.float64)
+    hours = np.asarray(finish_sec, dtype=np.float64) / 3600
+
+    age_edges = np.arange(AGE_EDGES[0], AGE_EDGES[1] + AGE_BIN, AGE_BIN, dtype=np.float64)
+    time_edges = np.arange(TIME_RANGE_HOURS[0] * 60, TIME_RANGE_HOURS[1] * 60 + TIME_BIN_MINUTES,
+                           TIME_BIN_MINUTES, dtype=np.float64) / 60
+    # wartości spoza zakresu w skrajnych komórkach - liczą się do gęstości, jak punkty przy krawędzi
+    counts, _, _ = np.histogram2d(np.clip(ages, age_edges[0], age_edges[-1]),
+                                  np.clip(hours, time_edges[0], time_edges[-1]),
+                                  bins=(age_edges, time_edges))
+    age_idx, time_idx = np.nonzero(counts)
+    cells = pd.DataFrame({
+        'age': age_edges[age_idx],
+        'age_end': age_edges[age_idx + 1],
+        'time': time_edges[time_idx].round(4),
+        'time_end': time_edges[time_idx + 1].round(4),
+        'count': counts[age_idx, time_idx].astype(np.int32),
+    })
+
+    # percentyle per rocznik: sortowanie po wieku i podział na grupy, bez pętli po wierszach
+    whole_ages = np.floor(ages).astype(np.int64)
+    order = np.argsort(whole_ages, kind='stable')
+    band_ages, starts, sizes = np.unique(whole_ages[order], return_index=True, return_counts=True)
+    rows = []
+    for age, start, size in zip(band_ages, starts, sizes):
+        if size < MIN_BAND_RUNNERS:
+            continue
+        p10, p50, p90 = np.percentile(hours[order[start:start + size]], (10, 50, 90))
+        rows.append((int(age), round(p10, 4), round(p50, 4), round(p90, 4)))
+    bands = pd.DataFrame(rows, columns=['age', 'p10', 'p50', 'p90'])
+
+    if len(hours):
+        time_domain = (max(TIME_RANGE_HOURS[0], float(hours.min()) - 0.1),
+                       min(TIME_RANGE_HOURS[1], float(hours.max()) + 0.1))
+    else:
+        time_domain = TIME_RANGE_HOURS
+    return DensitySummary(cells, bands, len(hours), time_domain)
+
+
+def density_spec(summary: DensitySummary, title: str) -> Dict:
+    """Specyfikacja Vega-Lite bez prognozy użytkownika - do zbudowania raz i współdzielenia"""
+    x = {'field': 'age', 'type': 'quantitative', 'title': 'Wiek',
+         'scale': {'domain': list(AGE_EDGES), 'nice': False}}
+    y_scale = {'domain': [round(v, 4) for v in summary.time_domain], 'nice': False}
+    return {
+        'title': title,
+        'height': 520,
+        'datasets': {'cells': summary.cells, 'bands': summary.bands},
+        'layer': [
+            {
+                'data': {'name': 'cells'},
+                'mark': {'type': 'rect', 'clip': True},
+                'encoding': {
+                    'x': x,
+                    'x2': {'field': 'age_end'},
+                    'y': {'field': 'time', 'type': 'quantitative', 'title': 'Czas (godziny)', 'scale': y_scale},
+                    'y2': {'field': 'time_end'},
+                    'color': {'field': 'count', 'type': 'quantitative', 'title': 'Liczba biegaczy',
+                              'scale': {'scheme': 'blues'}},
+                    'tooltip': [
+                        {'field': 'age', 'title': 'Wiek od'},
+                        {'field': 'time', 'title': 'Czas od (h)', 'format': '.2f'},
+                        {'field': 'count', 'title': 'Biegaczy'},
+                    ],
+                },
+            },
+            {
+                'data': {'name': 'bands'},
+                'mark': {'type': 'area', 'color': 'orange', 'opacity': 0.25, 'clip': True},
+                'encoding': {
+                    'x': x,
+                    'y': {'field': 'p10', 'type': 'quantitative', 'scale': y_scale},
+                    'y2': {'field': 'p90'},
+                },
+            },
+            {
+                'data': {'name': 'bands'},
+                'mark': {'type': 'line', 'color': 'darkorange', 'strokeWidth': 2, 'clip': True},
+                'encoding': {
+                    'x': x,
+                    'y': {'field': 'p50', 'type': 'quantitative', 'scale': y_scale},
+                    'tooltip': [
+                        {'field': 'age', 'title': 'Wiek'},
+                        {'field': 'p10', 'title': 'p10 (h)', 'format': '.2f'},
+                        {'field': 'p50', 'title': 'Mediana (h)', 'format': '.2f'},
+                        {'field': 'p90', 'title': 'p90 (h)', 'format': '.2f'},
+                    ],
+                },
+            },
+            {
+                'data': {'name': 'prediction'},
+                'mark': {'type': 'point', 'shape': STAR_SHAPE, 'size': 400, 'filled': True,
+                         'color': 'red', 'stroke': 'darkred', 'strokeWidth': 1.5, 'opacity': 1},
+                'encoding': {
+                    'x': x,
+                    'y': {'field': 'time', 'type': 'quantitative', 'scale': y_scale},
+                    'tooltip': [
+                        {'field': 'age', 'title': 'Twój wiek'},
+                        {'field': 'time', 'title': 'Twoja prognoza (h)', 'format': '.2f'},
+                    ],
+                },
+            },
+        ],
+    }
+
+
+def with_prediction(spec: Dict, age: float, time_hours: float) -> Dict:
+    """Kopia specyfikacji z gwiazdką użytkownika - wspólna specyfikacja nie jest modyfikowana"""
+    time_hours = round(float(time_hours), 4)
+    datasets = dict(spec['datasets'])
+    datasets['prediction'] = pd.DataFrame({'age': [float(age)], 'time': [time_hours]})
+
+    # oś czasu poszerzona o prognozę; kopiowane są tylko opisy warstw, nie dane
+    layers = copy.deepcopy(spec['layer'])
+    low, high = layers[0]['encoding']['y']['scale']['domain']
+    domain = [min(low, round(time_hours - 0.1, 4)), max(high, round(time_hours + 0.1, 4))]
+    for layer in layers:
+        layer['encoding']['y']['scale']['domain'] = domain
+    return {**spec, 'datasets': datasets, 'layer': layers}
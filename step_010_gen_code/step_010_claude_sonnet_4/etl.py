@@ -0,0 +1,131 @@
+# etl.py
+"""Przetwarzanie surowych wyników (data/raw) na pliki oczyszczone (data/current).
+
+Surowe pliki CSV (sep=';') są czytane strumieniowo w porcjach, a czasy HH:MM:SS
+parsowane wektorowo. W jednym przebiegu powstają wszystkie warianty:
+    halfmarathon_wroclaw_{rok}__final_cleaned_full.csv - wszyscy sklasyfikowani uczestnicy
+    halfmarathon_wroclaw_{rok}__final_cleaned.csv      - bez odstających czasów (reguła 1.5 IQR)
+    final_cleaned.csv                                  - złączenie wariantów *_cleaned ze wszystkich lat
+
+Użycie:
+    python etl.py [plik_raw.csv ...] [--out data/current] [--chunksize 100000]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_DIR = os.path.join(BASE_DIR, 'data', 'raw')
+CURRENT_DIR = os.path.join(BASE_DIR, 'data', 'current')
+
+RAW_COLUMNS = ['Miejsce', 'Płeć', 'Kategoria wiekowa', 'Rocznik', '5 km Czas', 'Czas']
+OUTPUT_COLUMNS = ['Miejsce', '5_km_sec', 'finish_sec', 'age', 'gender']
+GENDER_MAP = {'M': 'M', 'K': 'F'}
+RAW_NAME = re.compile(r'halfmarathon_wroclaw_(\d{4})__final\.csv$')
+
+
+def hms_to_seconds(values: pd.Series) -> pd.Series:
+    """Wektorowa konwersja HH:MM:SS na sekundy; DNS/DNF i puste pola dają NaN"""
+    return pd.to_timedelta(values, errors='coerce').dt.total_seconds()
+
+
+def parse_chunk(chunk: pd.DataFrame, year: int) -> pd.DataFrame:
+    """Surowa porcja -> kolumny Miejsce, 5_km_sec, finish_sec, age, gender, category (tylko ukończeni)"""
+    finish_sec = hms_to_seconds(chunk['Czas'])
+    birth_year = pd.to_numeric(chunk['Rocznik'], errors='coerce')
+    category = chunk['Kategoria wiekowa']
+    gender = chunk['Płeć'].map(GENDER_MAP).fillna(category.str[0].map(GENDER_MAP))
+
+    parsed = pd.DataFrame({
+        'Miejsce': pd.to_numeric(chunk['Miejsce'], errors='coerce'),
+        '5_km_sec': hms_to_seconds(chunk['5 km Czas']),
+        'finish_sec': finish_sec,
+        # Rocznik 0 oznacza brak danych
+        'age': (year - birth_year).where(birth_year > 0),
+        'gender': gender,
+        'category': category,
+    })
+    return parsed[parsed['Miejsce'].notna() & parsed['finish_sec'].notna()]
+
+
+def finalize_year(parsed: pd.DataFrame) -> pd.DataFrame:
+    """Uzupełnia braki i zwraca wariant *_cleaned_full jednego roku"""
+    df = parsed.sort_values(['finish_sec', 'Miejsce'], kind='stable').reset_index(drop=True)
+
+    # Brak rocznika: mediana wieku w tej samej kategorii wiekowej
+    category_median = df.groupby('category')['age'].transform('median').round()
+    df['age'] = df['age'].fillna(category_median)
+
+    # Brak czasu na 5 km: interpolacja liniowa w kolejności czasów ukończenia
+    df['5_km_sec'] = df['5_km_sec'].interpolate(limit_direction='both')
+
+    df = df.dropna(subset=['age', 'gender'])
+    df['finish_sec'] = df['finish_sec'].astype('int64')
+    df['age'] = df['age'].astype('int64')
+    return df[OUTPUT_COLUMNS].reset_index(drop=True)
+
+
+def remove_outliers(df: pd.DataFrame, column: str = 'finish_sec', k: float = 1.5) -> pd.DataFrame:
+    """Odrzuca wiersze spoza [Q1 - k*IQR, Q3 + k*IQR]"""
+    q1, q3 = df[column].quantile([0.25, 0.75])
+    iqr = q3 - q1
+    return df[df[column].between(q1 - k * iqr, q3 + k * iqr)].reset_index(drop=True)
+
+
+def read_raw(path: str, year: int, chunksize: int = 100_000) -> pd.DataFrame:
+    """Czyta surowy plik porcjami - w pamięci trzymane są tylko sparsowane kolumny"""
+    chunks = pd.read_csv(path, sep=';', usecols=RAW_COLUMNS, dtype=str, chunksize=chunksize)
+    return pd.concat((parse_chunk(chunk, year) for chunk in chunks), ignore_index=True)
+
+
+def year_from_path(path: str) -> int:
+    match = RAW_NAME.search(os.path.basename(path))
+    if not match:
+        raise ValueError(f"Nie rozpoznano roku w nazwie pliku: {path}")
+    return int(match.group(1))
+
+
+def run(raw_paths: Iterable[str], out_dir: str = CURRENT_DIR, chunksize: int = 100_000) -> Dict[str, int]:
+    """Przetwarza pliki surowe i zapisuje wszystkie warianty; zwraca liczbę wierszy w każdym pliku"""
+    os.makedirs(out_dir, exist_ok=True)
+    written: Dict[str, int] = {}
+    cleaned_years: List[pd.DataFrame] = []
+
+    for path in sorted(raw_paths, key=year_from_path):
+        year = year_from_path(path)
+        full = finalize_year(read_raw(path, year, chunksize))
+        cleaned = remove_outliers(full)
+        cleaned_years.append(cleaned)
+
+        for suffix, df in (('final_cleaned_full', full), ('final_cleaned', cleaned)):
+            name = f"halfmarathon_wroclaw_{year}__{suffix}.csv"
+            df.to_csv(os.path.join(out_dir, name), sep=';', index=False)
+            written[name] = len(df)
+
+    if cleaned_years:
+        combined = pd.concat(cleaned_years, ignore_index=True)
+        combined.to_csv(os.path.join(out_dir, 'final_cleaned.csv'), sep=';', index=False)
+        written['final_cleaned.csv'] = len(combined)
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('raw', nargs='*', help="surowe pliki halfmarathon_wroclaw_{rok}__final.csv")
+    parser.add_argument('--out', default=CURRENT_DIR)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    raw_paths = args.raw or glob.glob(os.path.join(RAW_DIR, 'halfmarathon_wroclaw_*__final.csv'))
+    for name, rows in run(raw_paths, args.out, args.chunksize).items():
+        print(f"{name}: {rows} wierszy")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# lazy_imports.py
+"""Odroczone importy ciężkich modułów (pycaret, boto3, matplotlib, langfuse).
+
+Strona wprowadzania danych renderuje się bez tych importów - moduły ładują się
+w tle po pierwszym renderze albo przy pierwszym użyciu.
+
+Benchmark czasu importu (każdy moduł w świeżym interpreterze):
+    python lazy_imports.py [moduł ...]
+"""
+import importlib
+import subprocess
+import sys
+import threading
+from types import ModuleType
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HEAVY_MODULES = [
+    'matplotlib.pyplot',
+    'boto3',
+    'langfuse.openai',
+    'pycaret.regression',
+]
+
+
+class LazyModule:
+    """Pośrednik modułu - właściwy import następuje przy pierwszym odwołaniu do atrybutu"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, item: str):
+        return getattr(self.load(), item)
+
+    def __repr__(self) -> str:
+        state = "załadowany" if self.loaded else "niezaładowany"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+_registry: Dict[str, LazyModule] = {}
+_registry_lock = threading.Lock()
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Zwraca współdzielony (na proces) pośrednik dla modułu o podanej nazwie"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def preload_in_background(names: Iterable[str] = HEAVY_MODULES) -> threading.Thread:
+    """Importuje moduły w wątku tła; błędy importu zostaną zgłoszone przy właściwym użyciu"""
+    modules = [lazy_module(name) for name in names]
+
+    def _preload():
+        for module in modules:
+            try:
+                module.load()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=_preload, name="lazy-imports-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def measure_import_time(name: str) -> float:
+    """Czas importu modułu (sekundy) w świeżym interpreterze - bez wpływu cache sys.modules"""
+    code = (
+        "import time, importlib; t = time.perf_counter(); "
+        f"importlib.import_module({name!r}); print(time.perf_counter() - t)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1] if result.stderr else name)
+    return float(result.stdout.strip())
+
+
+def benchmark(names: Iterable[str] = HEAVY_MODULES) -> List[Tuple[str, Optional[float]]]:
+    results = []
+    for name in names:
+        try:
+            results.append((name, measure_import_time(name)))
+        except ImportError:
+            results.append((name, None))
+    return results
+
+
+def main(argv=None) -> int:
+    names = (argv if argv is not None else sys.argv[1:]) or HEAVY_MODULES
+    total = 0.0
+    for name, seconds in benchmark(names):
+        if seconds is None:
+            print(f"{name:<22} brak modułu")
+        else:
+            total += seconds
+            print(f"{name:<22} {seconds * 1000:9.1f} ms")
+    print(f"{'razem':<22} {total * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
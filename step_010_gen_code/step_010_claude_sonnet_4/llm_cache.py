@@ -0,0 +1,86 @@
+# llm_cache.py
+"""Trwały cache odpowiedzi parsera LLM (SQLite), współdzielony przez sesje i procesy.
+
+Klucz to skrót znormalizowanego tekstu użytkownika oraz wersji promptu i modelu,
+więc zmiana promptu lub modelu unieważnia wcześniejsze wpisy. Cache ma limit
+liczby wpisów (usuwane najdawniej używane) i czas życia wpisu.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from dataset_cache import CACHE_DIR
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'llm_cache.sqlite')
+
+
+def normalize_text(text: str) -> str:
+    """Małe litery, pojedyncze spacje, bez znaków interpunkcyjnych na końcach"""
+    text = ' '.join(text.lower().split())
+    return re.sub(r'^[\s.,;!?]+|[\s.,;!?]+$', '', text)
+
+
+def cache_key(text: str, prompt: str, model: str) -> str:
+    prompt_version = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+    raw = f"{model}\x00{prompt_version}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 10_000, ttl_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # osobne połączenie na wątek - Streamlit obsługuje sesje w wielu wątkach
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, value: Dict) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(value, ensure_ascii=False), now, now))
+            conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
@@ -0,0 +1,252 @@
+# metrics.py
+"""Lekka instrumentacja ścieżki żądania: liczniki, czasy etapów i rozbicie czasu per żądanie.
+
+    with metrics.request('results'):          # jedno przejście skryptu Streamlit
+        with metrics.stage('s3_get'):          # etap wewnątrz żądania
+            ...
+        metrics.count('llm_cache_hits')
+
+Dane wychodzą trzema drogami:
+- render_prometheus() - format tekstowy Prometheusa, serwowany przez start_http_server()
+  (zmienna METRICS_PORT) pod /metrics,
+- log strukturalny (JSON, logger "halfmarathon.metrics") z rozbiciem czasu każdego żądania,
+- Langfuse: ślad żądania ze spanami etapów (gdy ustawiono LANGFUSE_PUBLIC_KEY); jego
+  identyfikator (current_trace_id) można przekazać do wywołań langfuse.openai. Eksport używa
+  API SDK 2.x (trace()/span() z jawnymi czasami) - wymaga langfuse<3, z nowszym SDK jest wyłączany.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('halfmarathon.metrics')
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'halfmarathon'
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class Registry:
+    """Metryki procesu - współdzielone przez wszystkie sesje"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], Callable[[], float]] = {}
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._histograms.setdefault(key, _Histogram()).observe(seconds)
+
+    def gauge(self, name: str, fn: Callable[[], float], **labels) -> None:
+        """Wartość odczytywana w chwili eksportu (np. długość kolejki)"""
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def fmt_labels(labels: Tuple, extra: Tuple = ()) -> str:
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            gauges = sorted(self._gauges.items(), key=lambda item: item[0])
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+                typed.add(name)
+            lines.append(f"{PREFIX}_{name}{fmt_labels(labels)} {value:g}")
+        for (name, labels), fn in gauges:
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}_{name} gauge")
+                typed.add(name)
+            lines.append(f"{PREFIX}_{name}{fmt_labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}_{name} histogram")
+                typed.add(name)
+            for bound, bucket in zip(BUCKETS, hist.buckets):
+                lines.append(f"{PREFIX}_{name}_bucket{fmt_labels(labels, (('le', f'{bound:g}'),))} {bucket}")
+            lines.append(f"{PREFIX}_{name}_bucket{fmt_labels(labels, (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"{PREFIX}_{name}_sum{fmt_labels(labels)} {hist.sum:.6f}")
+            lines.append(f"{PREFIX}_{name}_count{fmt_labels(labels)} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+@dataclass
+class RequestTrace:
+    name: str
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    stages: List[Tuple[str, datetime, float, bool]] = field(default_factory=list)
+
+    def breakdown_ms(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for name, _, seconds, _ in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds * 1000
+        return {name: round(ms, 2) for name, ms in totals.items()}
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar('halfmarathon_request', default=None)
+_langfuse = None  # klient Langfuse; False - SDK bez API 2.x, eksport wyłączony
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    registry.inc(name, value, **labels)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mierzy etap; czas trafia do histogramu procesu i do rozbicia bieżącego żądania"""
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException as e:
+        # przerwania skryptu Streamlit (st.rerun/st.stop) nie są błędami etapu
+        ok = type(e).__module__.startswith('streamlit')
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe('stage_seconds', elapsed, stage=name)
+        if not ok:
+            registry.inc('stage_errors_total', stage=name)
+        trace = _current.get()
+        if trace is not None:
+            trace.stages.append((name, started_at, elapsed, ok))
+
+
+@contextmanager
+def request(name: str) -> Iterator[RequestTrace]:
+    """Jedno żądanie (przebieg skryptu); na końcu log JSON i opcjonalnie ślad w Langfuse"""
+    trace = RequestTrace(name=name)
+    token = _current.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.reset(token)
+        registry.inc('requests_total', page=name)
+        registry.observe('request_seconds', elapsed, page=name)
+        if trace.stages:
+            logger.info(json.dumps({
+                'event': 'request',
+                'page': name,
+                'trace_id': trace.trace_id,
+                'total_ms': round(elapsed * 1000, 2),
+                'stages_ms': trace.breakdown_ms(),
+            }, ensure_ascii=False))
+            _export_to_langfuse(trace, elapsed)
+
+
+def _export_to_langfuse(trace: RequestTrace, elapsed: float) -> None:
+    global _langfuse
+    if not os.getenv('LANGFUSE_PUBLIC_KEY') or _langfuse is False:
+        return
+    try:
+        if _langfuse is None:
+            import langfuse
+            from langfuse import Langfuse
+            client = Langfuse()
+            if not hasattr(client, 'trace'):
+                logger.warning("Langfuse %s nie jest obsługiwany (wymagany langfuse<3) - eksport śladów wyłączony",
+                               getattr(langfuse, '__version__', '?'))
+                _langfuse = False
+                return
+            _langfuse = client
+        lf_trace = _langfuse.trace(id=trace.trace_id, name=f"page_{trace.name}", timestamp=trace.started,
+                                metadata={'total_ms': round(elapsed * 1000, 2), 'stages_ms': trace.breakdown_ms()})
+        for name, started_at, seconds, ok in trace.stages:
+            lf_trace.span(name=name, start_time=started_at, end_time=started_at + timedelta(seconds=seconds),
+                          level='DEFAULT' if ok else 'ERROR')
+    except Exception as e:
+        logger.debug("Eksport do Langfuse nieudany: %s", e)
+
+
+# Serwer HTTP z metrykami
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] == '/metrics':
+            status, body = 200, registry.render_prometheus()
+        else:
+            status, body = 404, 'not found\n'
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """Uruchamia (raz na proces) serwer /metrics w wątku tła; port z METRICS_PORT, bez portu - nic"""
+    global _server
+    port = port if port is not None else int(os.getenv('METRICS_PORT', '0') or 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(('0.0.0.0', port), _Handler)
+            except OSError as e:
+                # port zajęty, np. przez inny proces Streamlit na tym samym hoście
+                logger.warning("Serwer metryk nie wystartował na porcie %s: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+    return _server
@@ -0,0 +1,51 @@
+# prefetch.py
+"""Rozgrzewanie zasobów w tle, zanim będą potrzebne (np. model i dane w trakcie parsowania przez LLM).
+
+    prefetch.start('predictor', warm_predictor)   # strona wprowadzania - od razu po kliknięciu
+    prefetch.join('predictor')                    # strona podsumowania - dołącza do trwającego ładowania
+
+Zadanie pod danym kluczem działa najwyżej raz naraz (kolejne start() zwracają ten sam
+Future). Wynik trafia do cache Streamlit wywoływanych funkcji, więc po zakończeniu
+zadanie jest zapominane - strony po prostu wołają te same funkcje i trafiają w cache.
+Błąd rozgrzewania jest ignorowany: strona powtórzy ładowanie i sama pokaże komunikat.
+"""
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional
+
+import metrics
+from concurrent_loader import get_executor
+
+_in_flight: Dict[Hashable, Future] = {}
+_lock = threading.Lock()
+
+
+def start(key: Hashable, fn: Callable, *args) -> Future:
+    """Zleca fn(*args) w puli wątków, chyba że zadanie pod tym kluczem już trwa"""
+    with _lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        future = get_executor().submit(fn, *args)
+        _in_flight[key] = future
+    metrics.count('prefetch_total', key=str(key))
+
+    def forget(done: Future) -> None:
+        with _lock:
+            if _in_flight.get(key) is done:
+                del _in_flight[key]
+    future.add_done_callback(forget)
+    return future
+
+
+def join(key: Hashable, timeout: Optional[float] = None) -> bool:
+    """Czeka na trwające zadanie; True gdy nic nie trwa albo zakończyło się bez błędu"""
+    with _lock:
+        future = _in_flight.get(key)
+    if future is None:
+        return True
+    try:
+        future.result(timeout=timeout)
+        return True
+    except Exception:
+        return False
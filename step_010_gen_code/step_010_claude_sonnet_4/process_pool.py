@@ -0,0 +1,228 @@
+# process_pool.py
+"""Rysowanie wykresów i predykcja PyCaret w puli procesów zamiast w wątku skryptu Streamlit.
+
+Wszystkie sesje procesu dzielą jeden GIL - rysowanie wykresu jednego użytkownika
+zatrzymuje pozostałe sesje. Przy RENDER_WORKERS > 0 ta praca idzie do ograniczonej
+puli procesów. Procesy są rozgrzane: przy starcie ładują dane historycznych lat
+i (gdy nie ma tablicy predykcji ani lekkiego artefaktu) model PyCaret, a tła wykresów
+trzymają u siebie.
+
+    png = process_pool.render_chart(2024, dataset.version, 'M', title, age, hours)   # None -> licz w wątku skryptu
+    seconds = process_pool.predict('M', 35, 1500.0)                 # None -> predykcja w wątku skryptu
+
+Każde zadanie ma limit czasu (RENDER_TIMEOUT_SECONDS); po przekroczeniu, przy błędzie
+albo przy wyłączonej puli wynik to None, a wywołujący liczy sam. Metryki:
+worker_tasks_total{task, result}, worker_task_seconds{task}, worker_queue_depth (zadania
+zlecone i jeszcze nieukończone).
+
+Dane i tła wykresów w procesie roboczym są kluczowane wersją danych (ETag pliku). Aplikacja
+i procesy robocze biorą wersję z magazynu (TieredStore.head, rewalidacja co
+STORAGE_REVALIDATE_SECONDS). Zadanie z wersją nowszą niż znana procesowi wymusza sprawdzenie
+magazynu i załadowanie tej wersji; zadanie ze starszą wersją zwraca None, aż aplikacja też
+zobaczy nowy ETag.
+Przy SHARED_DATA_DIR procesy robocze mapują te same kolumny co procesy Streamlit (shared_arrays).
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Optional, Tuple
+
+import metrics
+
+WORKERS = int(os.getenv('RENDER_WORKERS', '0'))
+TIMEOUT = float(os.getenv('RENDER_TIMEOUT_SECONDS', '20'))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_init_args: Tuple[Tuple[int, ...], bool] = ((), False)
+_pending = 0
+
+# Stan procesu roboczego - wypełniany przez _init_worker i przy pierwszym użyciu
+_store = None
+_datasets: Dict[int, object] = {}
+_backgrounds: Dict[Tuple[int, str, Optional[str], str], object] = {}
+_model = None
+
+
+def enabled() -> bool:
+    return WORKERS > 0
+
+
+def _dataset(year: int, refresh: bool = False):
+    """Bieżąca wersja danych roku - jak app.fetch_historical_data, łącznie z shared_arrays.
+
+    refresh=True pomija zapamiętany ETag i pyta magazyn od razu.
+    """
+    global _store
+    import shared_arrays
+    from dataset_cache import load_results_frame
+    from rank_tables import historical_file_name
+    from results_dataset import ResultsDataset
+    from storage import get_store
+
+    if _store is None:
+        _store = get_store()
+    csv_key = 'current/' + historical_file_name(year)
+    if refresh:
+        _store.invalidate(csv_key)
+    etag = _store.head(csv_key).etag
+    dataset = _datasets.get(year)
+    if dataset is not None and dataset.version == etag:
+        return dataset
+
+    def build() -> ResultsDataset:
+        return ResultsDataset.from_frame(load_results_frame(_store, csv_key), etag)
+
+    if shared_arrays.enabled():
+        columns = shared_arrays.attach_or_publish(f'results_{year}', etag, lambda: build().columns)
+        dataset = ResultsDataset.from_columns(columns, etag)
+    else:
+        dataset = build()
+    _datasets[year] = dataset
+    # tła poprzedniej wersji danych tego roku nie będą już potrzebne
+    for key in [key for key in _backgrounds if key[0] == year and key[1] != etag]:
+        del _backgrounds[key]
+    return dataset
+
+
+def _pycaret_model():
+    global _model
+    if _model is None:
+        import pycaret.regression as pcr
+        from storage import get_store
+
+        _model = pcr.load_model(get_store().local_path('model/time_sec_model.pkl')[:-len('.pkl')], verbose=False)
+    return _model
+
+
+def _init_worker(years: Tuple[int, ...], preload_model: bool) -> None:
+    """Rozgrzanie procesu roboczego: importy, dane lat i ewentualnie model - zanim przyjdzie pierwsze zadanie"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+    for year in years:
+        try:
+            _dataset(year)
+        except Exception:
+            pass  # rok załaduje się przy pierwszym zadaniu albo zadanie zwróci błąd
+    if preload_model:
+        try:
+            _pycaret_model()
+        except Exception:
+            pass
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _render_chart(year: int, version: str, gender: Optional[str], title: str, x: float, y: float) -> Optional[bytes]:
+    from chart_cache import composite_marker, render_background
+
+    dataset = _dataset(year)
+    if dataset.version != version:
+        # wywołujący mógł sprawdzić ETag później niż ten proces - sprawdź magazyn jeszcze raz
+        dataset = _dataset(year, refresh=True)
+    if dataset.version != version:
+        return None  # wywołujący ma starszą wersję danych - wykres policzy sam, do swojej rewalidacji
+    key = (year, version, gender, title)
+    if key not in _backgrounds:
+        runners = dataset.view(gender)
+        if len(runners) == 0:
+            return None
+        _backgrounds[key] = render_background(runners.age, runners.finish_sec / 3600, title)
+    return composite_marker(_backgrounds[key], x, y)
+
+
+def _predict(gender: str, age: int, time_5km_sec: float) -> int:
+    import pandas as pd
+    import pycaret.regression as pcr
+
+    data = pd.DataFrame([{'gender': gender, 'age': age, '5_km_sec': float(time_5km_sec)}])
+    return int(pcr.predict_model(_pycaret_model(), data=data, verbose=False)['prediction_label'].iloc[0])
+
+
+def start(years: Optional[Iterable[int]] = None, preload_model: Optional[bool] = None) -> Optional[ProcessPoolExecutor]:
+    """Tworzy pulę (raz na proces) i uruchamia od razu wszystkie procesy robocze.
+
+    Bez argumentów - z ustawieniami poprzedniego wywołania (np. po awarii procesu roboczego).
+    """
+    global _pool, _init_args
+    if not enabled():
+        return None
+    with _pool_lock:
+        if years is not None or preload_model is not None:
+            _init_args = (tuple(years if years is not None else _init_args[0]),
+                          preload_model if preload_model is not None else _init_args[1])
+        if _pool is None:
+            # spawn - proces Streamlit ma wiele wątków, fork mógłby skopiować zablokowane locki
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=_init_args)
+            metrics.registry.gauge('worker_queue_depth', lambda: _pending)
+            for _ in range(WORKERS):
+                _pool.submit(_ping)
+    return _pool
+
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    """Pula z martwym procesem nie przyjmuje zadań - następne zadanie utworzy nową"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(task: str, fn, *args):
+    global _pending
+    pool = _pool or start()
+    if pool is None:
+        return None
+
+    def done(_):
+        global _pending
+        with _pool_lock:
+            _pending -= 1
+
+    started = time.perf_counter()
+    try:
+        future = pool.submit(fn, *args)
+        with _pool_lock:
+            _pending += 1
+        future.add_done_callback(done)
+        result = future.result(timeout=TIMEOUT)
+        metrics.count('worker_tasks_total', task=task, result='ok')
+        return result
+    except FutureTimeout:
+        # zadanie, które jeszcze nie ruszyło, nie zajmie procesu; trwające kończy się w tle
+        future.cancel()
+        metrics.count('worker_tasks_total', task=task, result='timeout')
+        return None
+    except BrokenProcessPool:
+        _discard(pool)
+        metrics.count('worker_tasks_total', task=task, result='error')
+        return None
+    except Exception:
+        metrics.count('worker_tasks_total', task=task, result='error')
+        return None
+    finally:
+        metrics.registry.observe('worker_task_seconds', time.perf_counter() - started, task=task)
+
+
+def render_chart(year: int, version: str, gender: Optional[str], title: str, x: float, y: float) -> Optional[bytes]:
+    """PNG wykresu roku (w wersji danych `version`) z gwiazdką w (x, y).
+
+    None gdy pula wyłączona, błąd, przekroczony czas albo proces roboczy widzi inną wersję danych.
+    """
+    return _run('render_chart', _render_chart, year, version, gender, title, x, y)
+
+
+def predict(gender: str, age: int, time_5km_sec: float) -> Optional[int]:
+    """Predykcja modelem PyCaret w procesie roboczym; None gdy pula wyłączona, błąd albo przekroczony czas"""
+    return _run('predict', _predict, gender, age, time_5km_sec)
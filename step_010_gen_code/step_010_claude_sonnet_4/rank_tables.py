@@ -0,0 +1,175 @@
+# rank_tables.py
+"""Tablice skumulowanych liczności czasów ukończenia - miejsce i percentyl jednym odczytem z tablicy.
+
+Dla każdego roku i grupy porównawczej (wszyscy / M / F, razem i w każdej kategorii
+wiekowej) przechowywana jest tablica counts[s] = liczba biegaczy z czasem ściśle
+mniejszym niż s sekund, dla s = 0..4 h. Miejsce to counts[s] + 1, liczba biegaczy
+to counts[-1]. Czasy powyżej 4 h lądują w ostatnim koszyku - za wszystkimi biegaczami.
+
+Tablice można wyeksportować do jednego pliku .npz i pokazywać rankingi dla dowolnej
+liczby lat bez wczytywania wierszy z wynikami:
+    python rank_tables.py build [--years 2023 2024] [--s3] [--out data/current/rank_tables.npz]
+
+Plik zapamiętuje wersję (ETag z magazynu, storage.py) danych każdego roku; aplikacja używa
+tablic roku tylko wtedy, gdy ta wersja zgadza się z wersją wczytanych danych.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+TABLES_VERSION = 2
+MAX_SECONDS = 4 * 3600
+GENDERS = (None, 'M', 'F')
+CATEGORIES = (None, 20, 30, 40, 50, 60, 70, 80)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CURRENT_DIR = os.path.join(BASE_DIR, 'data', 'current')
+DEFAULT_TABLES_PATH = os.path.join(CURRENT_DIR, 'rank_tables.npz')
+
+
+def historical_file_name(year: int) -> str:
+    return f"halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
+
+
+def _group_row(gender: Optional[str], category: Optional[int]) -> int:
+    return GENDERS.index(gender) * len(CATEGORIES) + CATEGORIES.index(category)
+
+
+def build_year(df: pd.DataFrame) -> np.ndarray:
+    """Tablica [grupa, sekunda] skumulowanych liczności dla jednego roku"""
+    df = df.dropna(subset=['age', 'finish_sec'])
+    genders = df['gender'].to_numpy() if 'gender' in df.columns else np.full(len(df), None)
+    return build_year_arrays(df['finish_sec'].to_numpy(dtype=np.float64), df['age'].to_numpy(), genders)
+
+
+def build_year_arrays(finish_sec: np.ndarray, age: np.ndarray, genders: np.ndarray) -> np.ndarray:
+    """Jak build_year, ale z gotowych kolumn (bez braków), np. z ResultsDataset"""
+    # czasy > 4 h w ostatnim koszyku - liczą się do sumy, ale nie do miejsc w zakresie tablicy
+    seconds = np.clip(np.ceil(np.asarray(finish_sec, dtype=np.float64)).astype(np.int64), 0, MAX_SECONDS + 1)
+    # kategorie wiekowe (dekady) jak w klasyfikacji biegu: 20, 30, ..., 80+ w jednej grupie
+    categories = np.minimum(80, np.maximum(20, np.asarray(age, dtype=np.int64) // 10 * 10))
+
+    dtype = np.uint16 if len(seconds) <= np.iinfo(np.uint16).max else np.uint32
+    tables = np.zeros((len(GENDERS) * len(CATEGORIES), MAX_SECONDS + 2), dtype=dtype)
+    for gender in GENDERS:
+        gender_mask = np.ones(len(seconds), dtype=bool) if gender is None else genders == gender
+        for category in CATEGORIES:
+            mask = gender_mask if category is None else gender_mask & (categories == category)
+            histogram = np.bincount(seconds[mask], minlength=MAX_SECONDS + 2)
+            # counts[s] = liczba czasów < s
+            tables[_group_row(gender, category), 1:] = np.cumsum(histogram)[:-1]
+            tables[_group_row(gender, category), -1] = mask.sum()
+    tables.setflags(write=False)
+    return tables
+
+
+class RankTables:
+    """Tablice wielu lat; klucz grupy to (płeć, kategoria wiekowa), None oznacza "wszyscy" """
+
+    def __init__(self, tables: Dict[int, np.ndarray], sources: Optional[Dict[int, str]] = None):
+        self._tables = tables
+        self._sources = sources or {}
+
+    @classmethod
+    def from_frames(cls, frames: Dict[int, pd.DataFrame], sources: Optional[Dict[int, str]] = None) -> "RankTables":
+        return cls({int(year): build_year(df) for year, df in frames.items()}, sources)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TABLES_PATH) -> "RankTables":
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != TABLES_VERSION or meta.get('max_seconds') != MAX_SECONDS:
+                raise ValueError(f"Nieobsługiwany format tablic miejsc: {meta}")
+            tables = {int(year): data[f"year_{year}"] for year in meta['years']}
+        for arr in tables.values():
+            arr.setflags(write=False)
+        return cls(tables, {int(year): etag for year, etag in meta['sources'].items()})
+
+    def save(self, path: str = DEFAULT_TABLES_PATH) -> None:
+        meta = {'version': TABLES_VERSION, 'max_seconds': MAX_SECONDS, 'years': self.years,
+                'sources': {str(year): etag for year, etag in self._sources.items()},
+                'genders': list(GENDERS), 'categories': list(CATEGORIES)}
+        arrays = {f"year_{year}": arr for year, arr in self._tables.items()}
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @property
+    def years(self) -> List[int]:
+        return sorted(self._tables)
+
+    def __contains__(self, year: int) -> bool:
+        return year in self._tables
+
+    def source(self, year: int) -> Optional[str]:
+        """Wersja danych (ETag), z których policzono tablice roku; None gdy nieznana"""
+        return self._sources.get(year)
+
+    def total(self, year: int, gender: Optional[str] = None, category: Optional[int] = None) -> int:
+        return int(self._tables[year][_group_row(gender, category), -1])
+
+    def place(self, year: int, finish_sec: float, gender: Optional[str] = None,
+              category: Optional[int] = None) -> Tuple[int, int, float]:
+        """Zwraca (miejsce, liczba biegaczy, percentyl); miejsce to liczba biegaczy z czasem ściśle mniejszym + 1"""
+        row = self._tables[year][_group_row(gender, category)]
+        total_runners = int(row[-1])
+        if total_runners == 0:
+            return 1, 0, 100.0
+        better_runners = int(row[min(max(int(np.ceil(finish_sec)), 0), MAX_SECONDS + 1)])
+        percentile = (1 - better_runners / total_runners) * 100
+        return better_runners + 1, total_runners, percentile
+
+    def place_many(self, year: int, finish_sec: np.ndarray, gender: Optional[str] = None,
+                   category: Optional[int] = None) -> Tuple[np.ndarray, int, np.ndarray]:
+        """Wektorowa wersja place(): (miejsca, liczba biegaczy, percentyle) dla tablicy czasów"""
+        finish_sec = np.asarray(finish_sec, dtype=np.float64)
+        row = self._tables[year][_group_row(gender, category)]
+        total_runners = int(row[-1])
+        if total_runners == 0:
+            return np.ones(len(finish_sec), dtype=np.int64), 0, np.full(len(finish_sec), 100.0)
+        seconds = np.clip(np.ceil(finish_sec), 0, MAX_SECONDS + 1).astype(np.int64)
+        better_runners = row[seconds].astype(np.int64)
+        return better_runners + 1, total_runners, (1 - better_runners / total_runners) * 100
+
+    def place_all_years(self, finish_sec: float, gender: Optional[str] = None,
+                        category: Optional[int] = None) -> pd.DataFrame:
+        """Miejsce, liczba biegaczy i percentyl dla każdego roku w tablicach"""
+        rows = []
+        for year in self.years:
+            place, total, percentile = self.place(year, finish_sec, gender, category)
+            rows.append({'year': year, 'place': place, 'total': total, 'percentile': percentile})
+        return pd.DataFrame(rows, columns=['year', 'place', 'total', 'percentile'])
+
+
+def load_frames(years: Iterable[int], use_s3: bool = False) -> Tuple[Dict[int, pd.DataFrame], Dict[int, str]]:
+    """Wyniki historyczne i ich wersje (ETag) - z dołączonych plików data/current albo z S3 (przez lokalny cache)"""
+    from dataset_cache import load_results_frame
+    from storage import get_store
+
+    store = get_store('s3' if use_s3 else 'local')
+    frames, sources = {}, {}
+    for year in years:
+        key = 'current/' + historical_file_name(year)
+        sources[year] = store.head(key).etag
+        frames[year] = load_results_frame(store, key)
+    return frames, sources
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--years', type=int, nargs='+', default=[2023, 2024])
+    parser.add_argument('--s3', action='store_true', help="dane historyczne z S3 zamiast data/current")
+    parser.add_argument('--out', default=DEFAULT_TABLES_PATH)
+    args = parser.parse_args(argv)
+
+    tables = RankTables.from_frames(*load_frames(args.years, args.s3))
+    tables.save(args.out)
+    print(f"Zapisano {args.out} (lata: {', '.join(map(str, tables.years))})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# results_cache.py
+"""Wspólny dla sesji cache kompletnego wyniku dla profilu biegacza (płeć, wiek, czas na 5 km).
+
+Popularne profile (np. mężczyźni 30-40 lat z okrągłym czasem na 5 km) powtarzają się
+między użytkownikami. Wpis trzyma przewidywany czas, a dla każdego wyświetlonego roku
+i filtra płci - miejsce, percentyl i gotowy PNG wykresu. Taki profil kosztuje więc
+jeden odczyt ze słownika zamiast predykcji, rankingu i rysowania.
+
+Klucz wpisu zawiera wersję modelu, a klucz części rocznej wersję danych tego roku -
+nowy model albo nowe dane nie zwrócą starego wyniku. Ograniczone są liczba wpisów
+(RESULTS_CACHE_SIZE) i łączny rozmiar obrazów PNG (RESULTS_CACHE_BYTES, domyślnie 64 MB) -
+po przekroczeniu którejkolwiek granicy usuwane są najdawniej używane wpisy (LRU).
+Trafienia i chybienia: metryki results_cache_total{part="profile"|"year", result="hit"|"miss"}.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional, Tuple
+
+import metrics
+
+RESULTS_CACHE_SIZE = int(os.getenv('RESULTS_CACHE_SIZE', '2048'))
+RESULTS_CACHE_BYTES = int(os.getenv('RESULTS_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+ProfileKey = Tuple[str, int, int, str]            # (płeć, wiek, czas na 5 km, wersja modelu)
+YearKey = Tuple[int, Optional[str], str]          # (rok, filtr płci, wersja danych)
+
+
+@dataclass(frozen=True)
+class YearResult:
+    place: int
+    total: int
+    percentile: float
+    chart_png: bytes
+
+
+@dataclass
+class ResultsPayload:
+    prediction: int
+    years: Dict[YearKey, YearResult] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(result.chart_png) for result in self.years.values())
+
+
+def profile_key(runner_data: Mapping, model_version: str) -> ProfileKey:
+    """Klucz ze zwalidowanych danych biegacza - te same dane z parsera i z LLM dają ten sam klucz"""
+    return (str(runner_data['gender']), int(runner_data['age']), int(runner_data['time_5km_sec']), model_version)
+
+
+class ResultsCache:
+    def __init__(self, max_entries: int = RESULTS_CACHE_SIZE, max_bytes: int = RESULTS_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[ProfileKey, ResultsPayload]" = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+        metrics.registry.gauge('results_cache_entries', lambda: len(self))
+        metrics.registry.gauge('results_cache_bytes', lambda: self._used)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _lookup(self, key: ProfileKey) -> Optional[ResultsPayload]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def get(self, key: ProfileKey) -> Optional[ResultsPayload]:
+        payload = self._lookup(key)
+        metrics.count('results_cache_total', part='profile', result='miss' if payload is None else 'hit')
+        return payload
+
+    def _evict(self) -> None:
+        """Usuwa najdawniej używane wpisy ponad limity - wołane pod blokadą"""
+        while self._entries and (len(self._entries) > self.max_entries or self._used > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._used -= evicted.nbytes
+
+    def put(self, key: ProfileKey, prediction: int) -> ResultsPayload:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None or payload.prediction != prediction:
+                if payload is not None:
+                    self._used -= payload.nbytes
+                payload = ResultsPayload(prediction)
+                self._entries[key] = payload
+            self._entries.move_to_end(key)
+            self._evict()
+            return payload
+
+    def get_year(self, key: ProfileKey, year_key: YearKey) -> Optional[YearResult]:
+        payload = self._lookup(key)
+        result = payload.years.get(year_key) if payload is not None else None
+        metrics.count('results_cache_total', part='year', result='miss' if result is None else 'hit')
+        return result
+
+    def put_year(self, key: ProfileKey, year_key: YearKey, result: YearResult) -> None:
+        # wpis mógł zostać usunięty z LRU - wtedy część roczna po prostu przepada
+        payload = self._lookup(key)
+        if payload is None or len(result.chart_png) > self.max_bytes:
+            return
+        with self._lock:
+            if self._entries.get(key) is not payload:
+                return
+            old = payload.years.get(year_key)
+            self._used += len(result.chart_png) - (len(old.chart_png) if old is not None else 0)
+            payload.years[year_key] = result
+            self._evict()
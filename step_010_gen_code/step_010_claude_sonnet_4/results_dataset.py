@@ -0,0 +1,84 @@
+# results_dataset.py
+"""Niezmienny zbiór wyników jednego roku - wspólny dla wszystkich sesji, bez kopii przy odczycie.
+
+st.cache_data zwraca przy każdym trafieniu świeżą kopię DataFrame (pickle), więc pamięć
+rośnie z liczbą sesji razy rozmiar danych. ResultsDataset trzyma kolumny jako tablice
+NumPy tylko do odczytu, z wierszami posortowanymi po płci i czasie ukończenia: podzbiór
+płci to wycinek (widok), a nie kopia. Obiekt jest przeznaczony do st.cache_resource.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ('finish_sec', 'age', 'gender')
+
+
+@dataclass(frozen=True)
+class ResultsView:
+    """Widok (bez kopiowania) na wiersze zbioru: wszyscy albo jedna płeć"""
+    finish_sec: np.ndarray
+    age: np.ndarray
+    gender: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.finish_sec)
+
+
+class ResultsDataset:
+    def __init__(self, columns: Dict[str, np.ndarray], gender_slices: Dict[str, slice], version: str = ''):
+        for arr in columns.values():
+            arr.setflags(write=False)
+        self._columns = columns
+        self._gender_slices = gender_slices
+        # wersja źródła (ETag pliku) - część kluczy cache liczonych z tych danych
+        self.version = version
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, version: str = '') -> "ResultsDataset":
+        """Jedna kopia przy budowie (sortowanie); wiersze bez wieku lub czasu są pomijane"""
+        missing = [col for col in COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Brakuje kolumn w danych: {missing}")
+        df = df.dropna(subset=['age', 'finish_sec'])
+
+        gender = df['gender'].astype(str).to_numpy(dtype=str)
+        finish_sec = df['finish_sec'].to_numpy(dtype=np.float64)
+        order = np.lexsort((finish_sec, gender))
+        return cls.from_columns({
+            'finish_sec': finish_sec[order],
+            'age': df['age'].to_numpy(dtype=np.float64)[order],
+            'gender': gender[order],
+        }, version)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray], version: str = '') -> "ResultsDataset":
+        """Kolumny już posortowane po płci i czasie (np. zmapowane z shared_arrays) - bez kopiowania"""
+        gender_slices = {}
+        sorted_gender = columns['gender']
+        for value in pd.unique(sorted_gender):
+            start = int(np.searchsorted(sorted_gender, value, side='left'))
+            stop = int(np.searchsorted(sorted_gender, value, side='right'))
+            gender_slices[str(value)] = slice(start, stop)
+        return cls(columns, gender_slices, version)
+
+    def __len__(self) -> int:
+        return len(self._columns['finish_sec'])
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        return dict(self._columns)
+
+    @property
+    def genders(self) -> Tuple[str, ...]:
+        return tuple(self._gender_slices)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in self._columns.values())
+
+    def view(self, gender: Optional[str] = None) -> ResultsView:
+        """Wszyscy (gender=None) albo wycinek jednej płci - zawsze widok na te same bufory"""
+        rows = slice(None) if gender is None else self._gender_slices.get(gender, slice(0, 0))
+        return ResultsView(**{name: arr[rows] for name, arr in self._columns.items()})
@@ -0,0 +1,163 @@
+# serving_model.py
+"""Lekki predyktor do serwowania - eksport potoku PyCaret do JSON i predykcja samym NumPy.
+
+Użycie:
+    python serving_model.py export [--model data/model/time_sec_model] [--out data/model/time_sec_model.serving.json]
+    python serving_model.py verify [--model ...] [--artifact ...] [--tol 0.01]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Union
+
+import numpy as np
+
+ARTIFACT_VERSION = 1
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model', 'time_sec_model')
+DEFAULT_ARTIFACT_PATH = f"{DEFAULT_MODEL_PATH}.serving.json"
+FEATURES = ['gender', 'age', '5_km_sec']
+
+ArrayLike = Union[float, int, str, List, np.ndarray]
+
+
+class ServingModel:
+    """Model liniowy z imputacją i kodowaniem porządkowym - odtworzenie potoku PyCaret"""
+
+    def __init__(self, spec: Dict):
+        if spec.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Nieobsługiwana wersja artefaktu: {spec.get('version')}")
+        self.spec = spec
+        self.features: List[str] = spec['features']
+        self.impute: Dict = spec['impute']
+        self.encoders: Dict[str, Dict[str, float]] = spec['encoders']
+        self.unknown_value: float = spec['unknown_value']
+        self.coef = np.asarray(spec['coef'], dtype=np.float64)
+        self.intercept = float(spec['intercept'])
+
+    @property
+    def version(self) -> str:
+        return self.spec['source_md5']
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_ARTIFACT_PATH) -> "ServingModel":
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _column(self, name: str, values: ArrayLike, n: int) -> np.ndarray:
+        if name in self.encoders:
+            mapping = self.encoders[name]
+            fill = self.impute.get(name)
+            raw = np.broadcast_to(np.asarray(values, dtype=object), (n,))
+            return np.array([mapping.get(fill if v is None else v, self.unknown_value) for v in raw],
+                            dtype=np.float64)
+        col = np.broadcast_to(np.asarray(values, dtype=np.float64), (n,))
+        if name in self.impute:
+            col = np.where(np.isnan(col), self.impute[name], col)
+        return col
+
+    def predict(self, gender: ArrayLike, age: ArrayLike, time_5km_sec: ArrayLike) -> np.ndarray:
+        """Przewidywany czas półmaratonu w sekundach (wektorowo)"""
+        inputs = {'gender': gender, 'age': age, '5_km_sec': time_5km_sec}
+        n = max(np.size(v) for v in inputs.values())
+        X = np.column_stack([self._column(name, inputs[name], n) for name in self.features])
+        return X @ self.coef + self.intercept
+
+
+def predict_fast(model: ServingModel, gender: ArrayLike, age: ArrayLike, time_5km_sec: ArrayLike) -> np.ndarray:
+    """Odpowiednik pcr.predict_model(...)['prediction_label'] bez importu PyCaret"""
+    return model.predict(gender, age, time_5km_sec)
+
+
+def _file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def export_pipeline(model_path: str = DEFAULT_MODEL_PATH, out_path: str = DEFAULT_ARTIFACT_PATH) -> Dict:
+    """Zamienia dopasowany potok PyCaret (time_sec_model.pkl) w artefakt JSON"""
+    import pycaret.regression as pcr
+
+    pipeline = pcr.load_model(model_path, verbose=False)
+    impute: Dict = {}
+    encoders: Dict[str, Dict] = {}
+    unknown_value = -1.0
+    estimator = None
+
+    for name, step in pipeline.steps:
+        transformer = getattr(step, 'transformer', step)
+        if name == 'actual_estimator':
+            estimator = step
+        elif hasattr(transformer, 'statistics_'):
+            for column, value in zip(transformer.feature_names_in_, transformer.statistics_):
+                impute[str(column)] = value.item() if hasattr(value, 'item') else value
+        elif hasattr(transformer, 'mapping') and transformer.mapping:
+            for entry in transformer.mapping:
+                encoders[entry['col']] = {str(k): float(v) for k, v in entry['mapping'].items()
+                                          if not (isinstance(k, float) and np.isnan(k))}
+        else:
+            raise ValueError(f"Nieobsługiwany krok potoku: {name} ({type(transformer).__name__})")
+
+    if estimator is None or not hasattr(estimator, 'coef_'):
+        raise ValueError(f"Eksport obsługuje tylko modele liniowe, otrzymano: {type(estimator).__name__}")
+
+    spec = {
+        'version': ARTIFACT_VERSION,
+        'source': os.path.basename(f"{model_path}.pkl"),
+        'source_md5': _file_md5(f"{model_path}.pkl"),
+        'estimator': type(estimator).__name__,
+        'features': [str(f) for f in estimator.feature_names_in_],
+        'impute': impute,
+        'encoders': encoders,
+        'unknown_value': unknown_value,
+        'coef': [float(c) for c in np.ravel(estimator.coef_)],
+        'intercept': float(np.ravel(estimator.intercept_)[0]),
+    }
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, indent=2, ensure_ascii=False)
+    return spec
+
+
+def verify(model_path: str = DEFAULT_MODEL_PATH, artifact_path: str = DEFAULT_ARTIFACT_PATH,
+           tol: float = 0.01) -> float:
+    """Porównuje predict_fast z predict_model na siatce wejść; zwraca maksymalną różnicę w sekundach"""
+    import pandas as pd
+    import pycaret.regression as pcr
+
+    pipeline = pcr.load_model(model_path, verbose=False)
+    model = ServingModel.load(artifact_path)
+
+    ages, genders, times = np.meshgrid(np.arange(18, 106, 3), ['M', 'F'], np.arange(900, 7201, 150))
+    data = pd.DataFrame({'gender': genders.ravel(), 'age': ages.ravel(), '5_km_sec': times.ravel().astype(float)})
+    expected = pcr.predict_model(pipeline, data=data, verbose=False)['prediction_label'].to_numpy()
+    actual = predict_fast(model, data['gender'].to_numpy(), data['age'].to_numpy(), data['5_km_sec'].to_numpy())
+
+    max_diff = float(np.max(np.abs(expected - actual)))
+    if max_diff > tol:
+        raise AssertionError(f"predict_fast odbiega od predict_model o {max_diff:.4f} s (tolerancja {tol})")
+    return max_diff
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="ścieżka modelu PyCaret bez rozszerzenia .pkl")
+    parser.add_argument('--out', '--artifact', dest='artifact', default=DEFAULT_ARTIFACT_PATH)
+    parser.add_argument('--tol', type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        spec = export_pipeline(args.model, args.artifact)
+        print(f"Zapisano {args.artifact} ({spec['estimator']}, cechy: {', '.join(spec['features'])})")
+    else:
+        max_diff = verify(args.model, args.artifact, args.tol)
+        print(f"OK - maksymalna różnica {max_diff:.6f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
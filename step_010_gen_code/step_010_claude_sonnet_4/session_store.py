@@ -0,0 +1,162 @@
+# session_store.py
+"""Stan sesji użytkownika poza procesem Streamlit - historia wpisów i policzone wyniki.
+
+st.session_state żyje tylko w procesie, który obsługuje połączenie: znika z nim i wiąże
+użytkownika z jedną repliką. Tutaj po każdym przebiegu skryptu zapisujemy migawkę pól
+sesji (SESSION_FIELDS) pod identyfikatorem z adresu strony (?sid=...), a nowe połączenie -
+na dowolnej replice - odtwarza ją z magazynu. Dzięki temu load balancer nie potrzebuje
+sticky sessions.
+
+- MemorySessionStore - w procesie (jedna replika, testy),
+- SQLiteSessionStore - plik SQLite wspólny dla procesów hosta albo na wspólnym wolumenie,
+- historia wpisów jest ograniczona (SESSION_MAX_HISTORY), a sesje nieużywane dłużej
+  niż SESSION_IDLE_SECONDS są usuwane przy zapisie - porzucone sesje nie zajmują pamięci
+  (w pamięci sesje są uporządkowane wg ostatniego użycia, więc zapis sprawdza tylko
+  najstarsze, a nie wszystkie).
+
+Magazyn wybiera SESSION_STORE (memory | sqlite; domyślnie memory).
+
+Bezpieczeństwo: identyfikator w adresie działa jak hasło do sesji - kto dostanie link
+z ?sid=..., zobaczy wpisane dane i prognozę tej osoby (do SESSION_IDLE_SECONDS od ostatniego
+użycia). Streamlit nie pozwala aplikacji ustawić ciasteczka, więc sesja nie jest z nim
+wiązana; w sesji nie ma danych logowania, a identyfikator jest losowy (128 bitów).
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from dataset_cache import CACHE_DIR
+
+SESSION_FIELDS = ('current_page', 'runner_data', 'prediction', 'results_key', 'data_history', 'history_index')
+MAX_HISTORY = int(os.getenv('SESSION_MAX_HISTORY', '20'))
+IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', str(24 * 3600)))
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'sessions.sqlite')
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def bound_history(history: List[str], index: int, max_len: int = MAX_HISTORY) -> Tuple[List[str], int]:
+    """Najnowsze max_len wpisów; indeks bieżącego wpisu przesunięty razem z historią (-1 gdy wypadł)"""
+    dropped = max(len(history) - max_len, 0)
+    if not dropped:
+        return history, index
+    return history[dropped:], (index - dropped if index >= dropped else -1)
+
+
+def snapshot(state) -> Dict:
+    """Pola sesji do zapisu (JSON) - z ograniczoną historią"""
+    data = {name: state[name] for name in SESSION_FIELDS if name in state}
+    if 'data_history' in data:
+        data['data_history'], data['history_index'] = bound_history(
+            list(data['data_history']), data.get('history_index', -1))
+    return data
+
+
+class MemorySessionStore:
+    def __init__(self, idle_seconds: float = IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        # kolejność = ostatnie użycie (najstarsze na początku) - wygasłe sesje są zawsze z przodu
+        self._sessions: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or now - entry[1] > self.idle_seconds:
+                self._sessions.pop(session_id, None)
+                return None
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+        return json.loads(entry[0])
+
+    def save(self, session_id: str, state: Dict) -> None:
+        now = time.monotonic()
+        value = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            self._sessions[session_id] = (value, now)
+            self._sessions.move_to_end(session_id)
+            # tylko wygasłe z przodu kolejki - koszt proporcjonalny do liczby usuwanych, nie wszystkich sesji
+            while self._sessions:
+                oldest, (_, accessed) = next(iter(self._sessions.items()))
+                if now - accessed <= self.idle_seconds:
+                    break
+                del self._sessions[oldest]
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path: str = DEFAULT_PATH, idle_seconds: float = IDLE_SECONDS):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # osobne połączenie na wątek - Streamlit obsługuje sesje w wielu wątkach
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT state, accessed FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            state, accessed = row
+            if now - accessed > self.idle_seconds:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                return None
+            conn.execute("UPDATE sessions SET accessed = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(state)
+
+    def save(self, session_id: str, state: Dict) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (session_id, state, accessed) VALUES (?, ?, ?)",
+                         (session_id, json.dumps(state, ensure_ascii=False), now))
+            conn.execute("DELETE FROM sessions WHERE accessed < ?", (now - self.idle_seconds,))
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def get_store(backend: Optional[str] = None):
+    """Magazyn sesji wg SESSION_STORE (memory | sqlite)"""
+    backend = backend or os.getenv('SESSION_STORE', 'memory')
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.getenv('SESSION_STORE_PATH', DEFAULT_PATH))
+    raise ValueError(f"Nieznany magazyn sesji: {backend} (dostępne: memory, sqlite)")
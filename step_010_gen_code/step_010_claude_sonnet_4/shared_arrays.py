@@ -0,0 +1,129 @@
+# shared_arrays.py
+"""Tablice NumPy publikowane raz na host i mapowane tylko do odczytu przez wszystkie procesy.
+
+Kilka procesów Streamlit na jednym hoście trzymało każdy własną kopię danych. Tutaj
+pierwszy proces zapisuje tablice jako pliki .npy w katalogu współdzielonym
+(`SHARED_DATA_DIR`, najlepiej tmpfs, np. /dev/shm/halfmarathon), a pozostałe tylko je
+mapują (np.load z mmap_mode='r') - strony pamięci są wspólne, więc pamięć hosta nie
+rośnie z liczbą procesów.
+
+    columns = shared_arrays.attach_or_publish('results_2024', etag, build)
+
+- wersja (np. ETag źródła) jest częścią nazwy katalogu - nowa wersja to nowy katalog,
+- publikuje jeden proces naraz (blokada plikowa), pozostałe czekają i mapują gotowe pliki,
+- katalog powstaje w tymczasowym miejscu i jest przemianowywany atomowo - nikt nie
+  zmapuje niepełnych plików; stare wersje są usuwane pod tą samą blokadą (procesy, które
+  je jeszcze mapują, zachowują dostęp do danych aż do zwolnienia mapowania, a attach()
+  trafiający na usuwany katalog zwraca None i przechodzi ścieżką z blokadą).
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SHARED_DATA_DIR = os.getenv('SHARED_DATA_DIR', '')
+META_FILE = 'meta.json'
+
+
+def enabled() -> bool:
+    return bool(SHARED_DATA_DIR)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Wyłączna blokada między procesami (i wątkami - każdy otwiera własny deskryptor)"""
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def bundle_path(name: str, version: str, root: str = SHARED_DATA_DIR) -> str:
+    return os.path.join(root, f"{name}.{re.sub(r'[^0-9A-Za-z-]', '', version)}")
+
+
+def attach(path: str) -> Optional[Dict[str, np.ndarray]]:
+    """Mapuje opublikowane tablice tylko do odczytu; None gdy katalogu nie ma (albo właśnie znika)"""
+    try:
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            names = json.load(f)['arrays']
+        return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in names}
+    except FileNotFoundError:
+        return None
+
+
+def publish(path: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Zapis atomowy: katalog tymczasowy obok docelowego + rename"""
+    root = os.path.dirname(path)
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+    try:
+        for name, arr in arrays.items():
+            if arr.dtype.hasobject:
+                raise ValueError(f"Tablica {name} ma typ object - nie da się jej zmapować")
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(arr))
+        with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'arrays': list(arrays)}, f)
+        # mkdtemp tworzy katalog 0700 - pozostałe procesy (także innych użytkowników) muszą go czytać
+        os.chmod(tmp_dir, 0o755)
+        os.rename(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _remove_other_versions(path: str, name: str) -> None:
+    """Usuwa katalogi innych wersji - wołane pod blokadą `name`, plik blokady zostaje"""
+    root = os.path.dirname(path)
+    for entry in os.listdir(root):
+        other = os.path.join(root, entry)
+        if (re.fullmatch(rf'{re.escape(name)}\.[0-9A-Za-z-]+', entry) and other != path
+                and entry != f'{name}.lock' and os.path.isdir(other)):
+            shutil.rmtree(other, ignore_errors=True)
+
+
+def attach_or_publish(name: str, version: str, build: Callable[[], Dict[str, np.ndarray]],
+                      root: str = SHARED_DATA_DIR) -> Dict[str, np.ndarray]:
+    """Tablice wersji `version`: mapowane, jeśli już opublikowane, inaczej build() i publikacja"""
+    path = bundle_path(name, version, root)
+    arrays = attach(path)
+    if arrays is not None:
+        metrics.count('shared_arrays_total', result='attach')
+        return arrays
+
+    os.makedirs(root, exist_ok=True)
+    with _file_lock(os.path.join(root, f'{name}.lock')):
+        arrays = attach(path)
+        if arrays is not None:
+            # opublikował inny proces, gdy czekaliśmy na blokadę
+            metrics.count('shared_arrays_total', result='attach')
+            return arrays
+        metrics.count('shared_arrays_total', result='publish')
+        # niepełny katalog tej wersji (np. przerwane usuwanie) blokowałby rename
+        shutil.rmtree(path, ignore_errors=True)
+        with metrics.stage('publish_shared'):
+            publish(path, build())
+        _remove_other_versions(path, name)
+        return attach(path)
@@ -0,0 +1,252 @@
+# storage.py
+"""Dostęp do plików aplikacji (wyniki historyczne, model) przez jeden interfejs magazynu.
+
+Klucze są logiczne i niezależne od magazynu: 'current/<plik>', 'model/<plik>', 'raw/<plik>'.
+
+- S3Store - bucket wk1, pliki pod zadanie_9/ (model w zadanie_9/models/),
+- LocalStore - dołączone katalogi data/{raw,current,model}; aplikacja działa i daje się
+  testować bez sieci i kluczy AWS (STORAGE_BACKEND=local),
+- TieredStore - odczyt przez warstwy: LRU w pamięci procesu -> dysk lokalny (plik
+  kluczowany ETagiem) -> magazyn; gorące odczyty nie wychodzą poza host.
+
+    store = get_store()                      # STORAGE_BACKEND: s3 (domyślnie) albo local
+    data = store.read('current/halfmarathon_wroclaw_2024__final_cleaned_full.csv')
+    path = store.local_path('model/time_sec_model.pkl')   # dla bibliotek, które chcą ścieżki
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+S3_BUCKET = 'wk1'
+S3_PREFIXES = {
+    'current/': 'zadanie_9/current/',
+    'model/': 'zadanie_9/models/',
+    'raw/': 'zadanie_9/raw/',
+}
+CACHE_DIR = os.path.join(os.getenv('HALFMARATHON_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'halfmarathon')), 'objects')
+MEMORY_CACHE_BYTES = int(os.getenv('STORAGE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+REVALIDATE_SECONDS = float(os.getenv('STORAGE_REVALIDATE_SECONDS', '300'))
+
+
+class VersionChanged(Exception):
+    """Obiekt w magazynie ma już inny ETag niż ten, o który prosi odczyt"""
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    etag: str
+    size: int
+
+
+class S3Store:
+    def __init__(self, client=None, bucket: str = S3_BUCKET):
+        if client is None:
+            import boto3
+            client = boto3.client('s3')
+        self.client = client
+        self.bucket = bucket
+
+    def remote_key(self, key: str) -> str:
+        for prefix, remote in S3_PREFIXES.items():
+            if key.startswith(prefix):
+                return remote + key[len(prefix):]
+        raise KeyError(f"Nieznany katalog w kluczu: {key}")
+
+    def head(self, key: str) -> ObjectInfo:
+        head = self.client.head_object(Bucket=self.bucket, Key=self.remote_key(key))
+        return ObjectInfo(key, head['ETag'].strip('"'), head['ContentLength'])
+
+    def read(self, key: str, etag: Optional[str] = None) -> bytes:
+        """Treść obiektu; z etag - tylko tej wersji (IfMatch), inaczej błąd zamiast niespójnych danych"""
+        kwargs = {'IfMatch': etag} if etag else {}
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.remote_key(key), **kwargs)['Body'].read()
+        except Exception as e:
+            # ClientError z botocore - bez importu na poziomie modułu (magazyn lokalny go nie potrzebuje)
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('PreconditionFailed', '412'):
+                raise VersionChanged(key) from e
+            raise
+
+
+class LocalStore:
+    """Pliki z katalogu (domyślnie dołączone data/); ETag z czasu modyfikacji i rozmiaru"""
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = os.path.abspath(root)
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise KeyError(f"Klucz poza katalogiem magazynu: {key}")
+        return path
+
+    def head(self, key: str) -> ObjectInfo:
+        st = os.stat(self.path(key))
+        return ObjectInfo(key, f"{st.st_mtime_ns:x}-{st.st_size:x}", st.st_size)
+
+    def read(self, key: str, etag: Optional[str] = None) -> bytes:
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+
+class TieredStore:
+    """Odczyt przez LRU w pamięci i dysk lokalny, zanim zapytamy magazyn.
+
+    Metadane (ETag) są sprawdzane w magazynie najwyżej co `revalidate_after` sekund -
+    w tym czasie odczyt z pamięci nie wykonuje żadnego zapytania. Nowa wersja obiektu
+    to nowy ETag, więc nowy plik na dysku (poprzednia wersja jest usuwana) i nowy wpis w pamięci.
+    """
+
+    def __init__(self, backend, cache_dir: str = CACHE_DIR, memory_bytes: int = MEMORY_CACHE_BYTES,
+                 revalidate_after: float = REVALIDATE_SECONDS):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.revalidate_after = revalidate_after
+        self._memory: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._memory_used = 0
+        self._heads: Dict[str, Tuple[ObjectInfo, float]] = {}
+        self._lock = threading.Lock()
+
+    def head(self, key: str) -> ObjectInfo:
+        with self._lock:
+            cached = self._heads.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.revalidate_after:
+            return cached[0]
+        with metrics.stage('storage_head'):
+            info = self.backend.head(key)
+        with self._lock:
+            self._heads[key] = (info, time.monotonic())
+        return info
+
+    def invalidate(self, key: str) -> None:
+        """Zapomina ETag klucza - następne head() zapyta magazyn (np. gdy ktoś widzi już nowszą wersję)"""
+        with self._lock:
+            self._heads.pop(key, None)
+
+    def read(self, key: str) -> bytes:
+        info = self.head(key)
+        data = self._memory_get(key, info.etag)
+        if data is not None:
+            metrics.count('storage_reads_total', tier='memory')
+            return data
+
+        path = self._local_path(key, info)
+        if os.path.exists(path):
+            metrics.count('storage_reads_total', tier='disk')
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            info, path, data = self._download(key, info)
+        self._memory_put(key, info.etag, data)
+        return data
+
+    def local_path(self, key: str) -> str:
+        """Ścieżka pliku z bieżącą wersją obiektu - pobiera go na dysk, jeśli trzeba"""
+        info = self.head(key)
+        path = self._local_path(key, info)
+        if not os.path.exists(path):
+            _, path, _ = self._download(key, info)
+        else:
+            metrics.count('storage_reads_total', tier='disk')
+        return path
+
+    def _download(self, key: str, info: ObjectInfo) -> Tuple[ObjectInfo, str, bytes]:
+        """Pobiera wersję `info` na dysk i usuwa poprzednie wersje pliku.
+
+        Gdy obiekt zmienił się od zapamiętanego head(), ETag jest sprawdzany od nowa
+        i odczyt ponawiany raz - zamiast błędu do końca okna rewalidacji.
+        """
+        metrics.count('storage_reads_total', tier='backend')
+        try:
+            with metrics.stage('storage_get'):
+                data = self.backend.read(key, info.etag)
+        except VersionChanged:
+            metrics.count('storage_version_changed_total')
+            self.invalidate(key)
+            info = self.head(key)
+            with metrics.stage('storage_get'):
+                data = self.backend.read(key, info.etag)
+        path = self._local_path(key, info)
+        _write_atomic(path, data)
+        self._remove_other_versions(key, path)
+        return info, path, data
+
+    def _remove_other_versions(self, key: str, path: str) -> None:
+        if isinstance(self.backend, LocalStore):
+            return
+        stem, ext = os.path.splitext(os.path.basename(key))
+        directory = os.path.dirname(path)
+        pattern = re.compile(rf'{re.escape(stem)}\.[0-9A-Za-z-]+{re.escape(ext)}')
+        for name in os.listdir(directory):
+            other = os.path.join(directory, name)
+            if pattern.fullmatch(name) and other != path:
+                try:
+                    os.unlink(other)
+                except OSError:
+                    pass  # np. plik otwarty w innym procesie (Windows) - usunie go następna wersja
+
+    def _local_path(self, key: str, info: ObjectInfo) -> str:
+        # magazyn lokalny nie potrzebuje drugiej kopii na dysku
+        if isinstance(self.backend, LocalStore):
+            return self.backend.path(key)
+        stem, ext = os.path.splitext(os.path.basename(key))
+        directory = os.path.join(self.cache_dir, os.path.dirname(key))
+        return os.path.join(directory, f"{stem}.{re.sub(r'[^0-9A-Za-z-]', '', info.etag)}{ext}")
+
+    def _memory_get(self, key: str, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _memory_put(self, key: str, etag: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old[1])
+            self._memory[key] = (etag, data)
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Plik tymczasowy + rename - inne procesy nie zobaczą niepełnego pliku"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def get_store(backend: Optional[str] = None) -> TieredStore:
+    """Magazyn wg STORAGE_BACKEND (s3 | local), opakowany warstwami cache"""
+    backend = backend or os.getenv('STORAGE_BACKEND', 's3')
+    if backend == 'local':
+        return TieredStore(LocalStore(os.getenv('LOCAL_DATA_DIR', DATA_DIR)))
+    if backend == 's3':
+        return TieredStore(S3Store())
+    raise ValueError(f"Nieznany magazyn: {backend} (dostępne: s3, local)")
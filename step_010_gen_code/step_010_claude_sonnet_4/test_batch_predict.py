@@ -0,0 +1,55 @@
+# test_batch_predict.py
+"""Predykcja wsadowa: wiersze spoza dziedziny zostają w wyniku z powodem w kolumnie error,
+także gdy trafią do dalszej porcji wyjścia Parquet.
+    python -m pytest -q test_batch_predict.py
+"""
+import pandas as pd
+import pytest
+
+import batch_predict
+
+ROWS = [
+    ('M', '30', '1500'),
+    ('K', '40', '1700'),
+    ('M', '30.5', '1500'),
+    ('F', 'abc', '1600'),
+    ('X', '35', '1500'),
+    ('M', '50', '9000'),
+]
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    path = tmp_path / 'zgloszenia.csv'
+    lines = ['gender;age;5_km_sec'] + [';'.join(row) for row in ROWS]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.csv'])
+def test_bad_rows_after_first_chunk_are_kept(input_csv, tmp_path, suffix):
+    out = str(tmp_path / f'prognozy{suffix}')
+    rows, rejected = batch_predict.run(input_csv, out, [2024], chunksize=2)
+    assert (rows, rejected) == (len(ROWS), 4)
+
+    result = pd.read_parquet(out) if suffix == '.parquet' else pd.read_csv(out, sep=';')
+    errors = result['error'].fillna('').tolist()
+    assert errors[:2] == ['', '']
+    assert all(errors[2:])
+    assert result['finish_sec'].iloc[:2].notna().all()
+    assert result['finish_sec'].iloc[2:].isna().all()
+
+
+def test_parquet_schema_does_not_depend_on_first_chunk(input_csv, tmp_path):
+    # pierwsza porcja bez ani jednego poprawnego wiersza
+    out = str(tmp_path / 'prognozy.parquet')
+    reordered = tmp_path / 'odwrocone.csv'
+    lines = ['gender;age;5_km_sec'] + [';'.join(row) for row in reversed(ROWS)]
+    reordered.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    rows, rejected = batch_predict.run(str(reordered), out, [2024], chunksize=2)
+    result = pd.read_parquet(out)
+    assert (rows, rejected) == (len(ROWS), 4)
+    assert str(result['age'].dtype) == 'float64'
+    assert str(result['place_2024'].dtype) == 'Int64'
+    assert result['finish_sec'].notna().sum() == 2
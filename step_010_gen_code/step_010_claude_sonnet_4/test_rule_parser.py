@@ -0,0 +1,53 @@
+# test_rule_parser.py
+"""Parser regułowy: pewne opisy dają wynik, a czasy innych dystansów trafiają do LLM (None).
+
+Ten sam plik rule_parser.py jest w aplikacjach gemini i step_009 - testowane są wszystkie kopie.
+    python -m pytest -q test_rule_parser.py
+"""
+import importlib.util
+import os
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COPIES = [
+    os.path.join(BASE_DIR, 'rule_parser.py'),
+    os.path.join(BASE_DIR, '..', 'step_010_gemini_2.5_pro', 'rule_parser.py'),
+    os.path.join(BASE_DIR, '..', '..', 'step_009_gen_prompt', 'step_009_claude_sonnet_3.7', 'utils', 'rule_parser.py'),
+]
+
+
+@pytest.fixture(params=COPIES, ids=['claude', 'gemini', 'step_009'])
+def extract(request):
+    spec = importlib.util.spec_from_file_location(f'rule_parser_{request.param_index}', request.param)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.extract_runner_data
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Jestem 35-letnim mężczyzną, a mój czas na 5 km to 22:30", {'age': 35, 'gender': 'M', 'time_5km_sec': 1350}),
+    ("Mam 28 lat, jestem kobietą, tempo 5'06''", {'age': 28, 'gender': 'F', 'time_5km_sec': 1530}),
+    ("5km w 24:10, 40 lat, mężczyzna", {'age': 40, 'gender': 'M', 'time_5km_sec': 1450}),
+    ("Kobieta, 21 lat, parkrun 28:15", {'age': 21, 'gender': 'F', 'time_5km_sec': 1695}),
+])
+def test_confident_descriptions(extract, text, expected):
+    result = extract(text)
+    assert result is not None
+    assert {key: result[key] for key in expected} == expected
+
+
+@pytest.mark.parametrize('text', [
+    "Mężczyzna, 35 lat, czas na 10 km to 45:00",
+    "Kobieta, 40 lat, półmaraton przebiegłam w 1:45:00",
+    "Mam 30 lat, jestem mężczyzną, maraton 3:30:00",
+    "Mężczyzna, 33 lata, 21 km w 1:50:00",
+    "Mężczyzna, 33 lata, 21,1 km w 1:50:00",
+    "Kobieta, 29 lat, 10k 52:00",
+    "Mężczyzna, 45 lat, 5 km w 24:00, a półmaraton w 1:52:00",
+    # czas bez powiązania z 5 km - nie wiadomo, jakiego dystansu dotyczy
+    "Mam 30 lat, jestem kobietą, mój czas to 25:00",
+    "Mężczyzna, 50 lat, tempo 5:00/km w biegu na 10 km",
+])
+def test_other_distance_or_unbound_time_goes_to_llm(extract, text):
+    assert extract(text) is None
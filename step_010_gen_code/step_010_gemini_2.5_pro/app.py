@@ -2,17 +2,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from pycaret.regression import predict_model
+# matplotlib, seaborn i pycaret są importowane dopiero na stronach, które ich potrzebują
 
-from s3_utils import get_s3_client, load_csv_from_s3, get_prediction_model
+from s3_utils import get_s3_client, load_years_from_s3, get_prediction_model, get_prediction_grid, gender_rows
 from llm_parser import parse_runner_data_with_llm
 from utils import seconds_to_hms, seconds_to_ms, create_pace_conversion_table
+import warmup
 
 # --- Konfiguracja strony i inicjalizacja stanu ---
 st.set_page_config(page_title="Prognoza Półmaratonu", layout="wide")
 
+# Rozgrzewanie w tle (raz na proces) - przy `python serve.py` rusza już przy starcie serwera
+warmup.start()
+
 def initialize_state():
     """Inicjalizuje stan sesji przy pierwszym uruchomieniu."""
     if 'page' not in st.session_state:
@@ -115,6 +117,15 @@ def render_summary_page():
         st.rerun()
     if c2.button("🚀 Oszacuj czas w półmaratonie!", type="primary", use_container_width=True):
         with st.spinner("Ładowanie modelu i wykonywanie predykcji..."):
+            # Tablica predykcji dla całej dziedziny - bez ładowania modelu i PyCaret
+            grid = get_prediction_grid()
+            predicted = grid.lookup(data['gender'], data['age'], data['5_km_sec']) if grid else None
+            if predicted is not None:
+                st.session_state.predicted_time_sec = predicted
+                st.session_state.page = 'results'
+                st.rerun()
+
+            from pycaret.regression import predict_model
             model = get_prediction_model()
             if model:
                 input_df = pd.DataFrame([data])
@@ -125,6 +136,51 @@ def render_summary_page():
             else:
                 st.error("Nie udało się załadować modelu. Predykcja niemożliwa.")
 
+@st.fragment
+def render_year_tab(year: int, hist_data: pd.DataFrame):
+    """Zakładka roku jako fragment - zmiana filtra płci przelicza tylko tę zakładkę."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    gender_filter = st.radio(
+        "Pokaż wyniki dla:", ("Wszystkich uczestników", "Tylko mojej płci"),
+        key=f"gender_filter_{year}", horizontal=True
+    )
+
+    # hist_data jest współdzielone między sesjami - tylko odczyt, podzbiór płci jako wycinek
+    rank_gender = st.session_state.runner_data['gender'] if gender_filter == "Tylko mojej płci" else None
+    filtered_data = gender_rows(hist_data, rank_gender)
+
+    user_time_sec = st.session_state.predicted_time_sec
+    faster_runners = filtered_data[filtered_data['finish_sec'] < user_time_sec].shape[0]
+    user_rank = faster_runners + 1
+    total_runners = len(filtered_data)
+
+    st.metric(
+        label=f"Szacowane miejsce w {year} ({'wszyscy' if gender_filter.startswith('W') else 'w kat. płci'})",
+        value=f"{user_rank} / {total_runners + 1}"
+    )
+
+    st.write("#### Porównanie na tle innych biegaczy")
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.scatterplot(data=filtered_data, x='age', y='finish_sec', alpha=0.3, label='Inni uczestnicy', ax=ax)
+    ax.scatter(
+        [st.session_state.runner_data['age']], [user_time_sec],
+        color='red', s=250, edgecolor='black', marker='*', label='Twój przewidywany wynik'
+    )
+    ax.set_title(f"Wyniki Półmaratonu {year} vs. Twoja Prognoza", fontsize=16)
+    ax.set_xlabel("Wiek", fontsize=12)
+    ax.set_ylabel("Czas ukończenia (HH:MM:SS)", fontsize=12)
+    ax.legend()
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+    # Formatowanie osi Y
+    y_ticks = ax.get_yticks()
+    ax.set_yticklabels([seconds_to_hms(int(s)) for s in y_ticks])
+    st.pyplot(fig)
+    # fragment przelicza się przy każdej zmianie filtra - zamknięta figura nie zostaje w pamięci pyplot
+    plt.close(fig)
+
 def render_results_page():
     """Strona 3: Wyniki i wizualizacja."""
     st.title("🏆 Wyniki Predykcji i Analiza")
@@ -146,53 +202,24 @@ def render_results_page():
         st.error("Nie można wyświetlić wizualizacji z powodu problemu z połączeniem S3.")
         return
 
-    tabs = st.tabs(["Półmaraton Wrocławski 2024", "Półmaraton Wrocławski 2023"])
-    for i, tab in enumerate(tabs):
-        with tab:
-            year = 2024 - i
-            file_key = f"zadanie_9/current/halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
+    # Liczy się tylko otwarta zakładka (on_change="rerun" + tab.open); dane roku ładowane przed rysowaniem
+    years = [2024, 2023]
+    tabs = st.tabs([f"Półmaraton Wrocławski {year}" for year in years], key="results_tabs", on_change="rerun")
+    open_years = [year for tab, year in zip(tabs, years) if tab.open]
+    frames, timed_out = load_years_from_s3(s3_client, open_years)
 
-            hist_data = load_csv_from_s3(s3_client, file_key)
+    for tab, year in zip(tabs, years):
+        if year not in frames:
+            continue
+        with tab:
+            hist_data = frames[year]
+            if year in timed_out:
+                st.warning(f"Dane dla roku {year} ładują się zbyt długo. Odśwież stronę za chwilę.")
+                continue
             if hist_data is None:
                 st.warning(f"Nie udało się załadować danych dla roku {year}.")
                 continue
-
-            gender_filter = st.radio(
-                "Pokaż wyniki dla:", ("Wszystkich uczestników", "Tylko mojej płci"),
-                key=f"gender_filter_{year}", horizontal=True
-            )
-
-            filtered_data = hist_data.copy()
-            if gender_filter == "Tylko mojej płci":
-                filtered_data = hist_data[hist_data['gender'] == st.session_state.runner_data['gender']]
-
-            user_time_sec = st.session_state.predicted_time_sec
-            faster_runners = filtered_data[filtered_data['finish_sec'] < user_time_sec].shape[0]
-            user_rank = faster_runners + 1
-            total_runners = len(filtered_data)
-
-            st.metric(
-                label=f"Szacowane miejsce w {year} ({'wszyscy' if gender_filter.startswith('W') else 'w kat. płci'})",
-                value=f"{user_rank} / {total_runners + 1}"
-            )
-
-            st.write("#### Porównanie na tle innych biegaczy")
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.scatterplot(data=filtered_data, x='age', y='finish_sec', alpha=0.3, label='Inni uczestnicy', ax=ax)
-            ax.scatter(
-                [st.session_state.runner_data['age']], [user_time_sec],
-                color='red', s=250, edgecolor='black', marker='*', label='Twój przewidywany wynik'
-            )
-            ax.set_title(f"Wyniki Półmaratonu {year} vs. Twoja Prognoza", fontsize=16)
-            ax.set_xlabel("Wiek", fontsize=12)
-            ax.set_ylabel("Czas ukończenia (HH:MM:SS)", fontsize=12)
-            ax.legend()
-            ax.grid(True, linestyle='--', alpha=0.6)
-
-            # Formatowanie osi Y
-            y_ticks = ax.get_yticks()
-            ax.set_yticklabels([seconds_to_hms(int(s)) for s in y_ticks])
-            st.pyplot(fig)
+            render_year_tab(year, hist_data)
 
     if st.button("🏁 Rozpocznij od nowa", use_container_width=True):
         # Czyszczenie stanu sesji na potrzeby nowego przebiegu
@@ -0,0 +1,58 @@
+# etag_cache.py
+"""Cache obiektów S3 w pamięci procesu, odświeżany warunkowo zamiast po TTL.
+
+Wpis trzyma wartość razem z ETagiem obiektu. Przez `revalidate_after` sekund wpis jest
+zwracany bez żadnego zapytania (hit). Potem idzie jedno warunkowe zapytanie
+(GET z If-None-Match): 304 oznacza, że obiekt się nie zmienił i wpis zostaje
+(revalidated), a nowa treść jest ładowana tylko po faktycznej zmianie (miss).
+Co godzinę jest więc najwyżej jedno tanie zapytanie o metadane, a nie pobranie i parsowanie pliku.
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+# fetch(etag) -> None, gdy obiekt o tym ETagu się nie zmienił, inaczej (nowy ETag, wartość)
+Fetch = Callable[[str | None], tuple[str, Any] | None]
+
+
+@dataclass
+class _Entry:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    etag: str | None = None
+    value: Any = None
+    checked_at: float = float("-inf")
+
+
+class ETagCache:
+    def __init__(self, revalidate_after: float):
+        self.revalidate_after = revalidate_after
+        self.stats = Counter()
+        self._entries: dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, fetch: Fetch) -> Any:
+        """Wartość dla klucza; fetch jest wołany tylko dla nowego albo przeterminowanego wpisu.
+
+        Wyjątek z fetch nie jest zapamiętywany - następne wywołanie spróbuje ponownie.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+        # jedno ładowanie na klucz naraz - pozostałe wątki czekają na jego wynik
+        with entry.lock:
+            if entry.etag is not None and time.monotonic() - entry.checked_at < self.revalidate_after:
+                self._count("hit")
+                return entry.value
+            result = fetch(entry.etag)
+            entry.checked_at = time.monotonic()
+            if result is None:
+                self._count("revalidated")
+                return entry.value
+            self._count("miss")
+            entry.etag, entry.value = result
+            return entry.value
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            self.stats[result] += 1
@@ -1,20 +1,38 @@
 # llm_parser.py
 import os
 import json
-from langfuse.openai import OpenAI
+from functools import lru_cache
 from dotenv import load_dotenv
 
+from rule_parser import extract_runner_data
+
 load_dotenv()
 
-# Zgodnie z poleceniem, używamy klienta Langfuse
-client = OpenAI(
-    # Klucze Langfuse są opcjonalne, ale pozwalają na śledzenie wywołań
-    # public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    # secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-)
+@lru_cache(maxsize=1)
+def get_client():
+    """Tworzy klienta przy pierwszym użyciu - import langfuse nie spowalnia startu aplikacji."""
+    # Zgodnie z poleceniem, używamy klienta Langfuse
+    from langfuse.openai import OpenAI
+
+    return OpenAI(
+        # Klucze Langfuse są opcjonalne, ale pozwalają na śledzenie wywołań
+        # public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+        # secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+    )
 
 def parse_runner_data_with_llm(text_input: str) -> dict:
-    """Używa LLM do ekstrakcji i walidacji danych biegacza z tekstu."""
+    """Używa LLM do ekstrakcji i walidacji danych biegacza z tekstu.
+
+    Typowe opisy rozpoznaje najpierw lokalny parser regułowy - LLM jest wołany tylko,
+    gdy reguły nie dają jednoznacznego wyniku.
+    """
+    rule_result = extract_runner_data(text_input)
+    if rule_result is not None:
+        return {
+            "age": rule_result["age"],
+            "gender": rule_result["gender"],
+            "5_km_sec": float(rule_result["time_5km_sec"])
+        }
 
     system_prompt = """
     Twoim zadaniem jest precyzyjne wyekstrahowanie informacji o biegaczu z podanego tekstu.
@@ -38,7 +56,7 @@ def parse_runner_data_with_llm(text_input: str) -> dict:
     """
 
     try:
-        completion = client.chat.completions.create(
+        completion = get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -0,0 +1,159 @@
+# model_fetch.py
+"""Pobieranie artefaktów (modelu) z S3 - jedno pobranie na wersję, nawet przy wielu sesjach i procesach.
+
+- plik lokalny jest nazwany ETagiem obiektu, więc nowa wersja w S3 to nowy plik,
+- blokada plikowa (międzyprocesowa, jedna na obiekt) - pobiera tylko pierwszy proces,
+  pozostałe czekają i używają gotowego pliku; pod nią usuwane są poprzednie wersje,
+- zapis do pliku tymczasowego i atomowy rename - nikt nie wczyta częściowego pliku,
+- weryfikacja rozmiaru i sumy kontrolnej (ChecksumSHA256, jeśli obiekt ją ma, inaczej
+  ETag - tylko gdy jest MD5 treści: zwykły upload bez SSE-KMS/SSE-C),
+- duże pliki pobierane równolegle kawałkami (GET z nagłówkiem Range).
+"""
+import base64
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PART_SIZE = 8 * 1024 * 1024
+MAX_PARALLEL_PARTS = 8
+
+
+@contextmanager
+def file_lock(path: str):
+    """Wyłączna blokada pliku - działa między procesami i między wątkami jednego procesu."""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def versioned_path(dest_dir: str, key: str, etag: str) -> str:
+    stem, ext = os.path.splitext(os.path.basename(key))
+    return os.path.join(dest_dir, f"{stem}.{re.sub(r'[^0-9A-Za-z-]', '', etag)}{ext}")
+
+
+def _download_whole(s3_client, bucket: str, key: str, etag: str, tmp_path: str) -> None:
+    body = s3_client.get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+    with open(tmp_path, "wb") as f:
+        for chunk in iter(lambda: body.read(1024 * 1024), b""):
+            f.write(chunk)
+
+
+def _download_ranges(s3_client, bucket: str, key: str, etag: str, size: int, tmp_path: str) -> None:
+    """Równoległe GET-y z Range; każdy kawałek zapisywany pod swoim przesunięciem."""
+    with open(tmp_path, "wb") as f:
+        f.truncate(size)
+    fd = os.open(tmp_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    write_lock = threading.Lock()
+
+    def fetch_part(start: int) -> None:
+        end = min(start + PART_SIZE, size) - 1
+        # IfMatch - wszystkie kawałki z tej samej wersji obiektu
+        data = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)["Body"].read()
+        if len(data) != end - start + 1:
+            raise IOError(f"Niepełny fragment {start}-{end} pliku {key}")
+        if hasattr(os, "pwrite"):
+            os.pwrite(fd, data, start)
+        else:
+            with write_lock:
+                os.lseek(fd, start, os.SEEK_SET)
+                os.write(fd, data)
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_PARTS) as pool:
+            list(pool.map(fetch_part, range(0, size, PART_SIZE)))
+    finally:
+        os.close(fd)
+
+
+def _etag_is_md5(head: dict, etag: str) -> bool:
+    """ETag to MD5 treści tylko dla obiektu wgranego jednym PUT-em, bez SSE-KMS i SSE-C"""
+    if not re.fullmatch(r"[0-9a-fA-F]{32}", etag):
+        return False  # np. upload wieloczęściowy: "<md5 md5-ów>-<liczba części>"
+    return not (head.get("ServerSideEncryption", "").startswith("aws:kms") or head.get("SSECustomerAlgorithm"))
+
+
+def _verify(path: str, head: dict, etag: str) -> None:
+    size = os.path.getsize(path)
+    if size != head["ContentLength"]:
+        raise IOError(f"Rozmiar pobranego pliku {size} B zamiast {head['ContentLength']} B")
+
+    sha256 = head.get("ChecksumSHA256")
+    if sha256 and "-" not in sha256:
+        digest, expected = hashlib.sha256(), sha256
+    elif _etag_is_md5(head, etag):
+        digest, expected = hashlib.md5(), etag.lower()
+    else:
+        return  # upload wieloczęściowy albo szyfrowanie KMS/SSE-C bez sumy SHA256 - zostaje kontrola rozmiaru
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    actual = base64.b64encode(digest.digest()).decode() if digest.name == "sha256" else digest.hexdigest()
+    if actual != expected:
+        raise IOError(f"Suma kontrolna pobranego pliku się nie zgadza ({actual} != {expected})")
+
+
+def lock_path(dest_dir: str, key: str) -> str:
+    """Jedna blokada na obiekt (nie na wersję) - pliki blokad się nie mnożą"""
+    return os.path.join(dest_dir, f"{os.path.basename(key)}.lock")
+
+
+def _remove_other_versions(path: str, key: str) -> None:
+    """Usuwa poprzednie wersje i ich blokady (starszy format: blokada na wersję) - wołane pod blokadą obiektu"""
+    directory = os.path.dirname(path)
+    stem, ext = os.path.splitext(os.path.basename(key))
+    for name in os.listdir(directory):
+        other = os.path.join(directory, name)
+        if re.fullmatch(rf"{re.escape(stem)}\.[0-9A-Za-z-]+{re.escape(ext)}(?:\.lock)?", name) and other != path:
+            try:
+                os.unlink(other)
+            except OSError:
+                pass
+
+
+def fetch(s3_client, bucket: str, key: str, dest_dir: str) -> str:
+    """Zwraca ścieżkę lokalnej kopii bieżącej wersji obiektu; pobiera ją najwyżej raz."""
+    head = s3_client.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+    etag = head["ETag"].strip('"')
+    path = versioned_path(dest_dir, key, etag)
+    # plik pojawia się tylko przez rename po weryfikacji - jeśli istnieje, jest kompletny
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(dest_dir, exist_ok=True)
+    with file_lock(lock_path(dest_dir, key)):
+        if os.path.exists(path):
+            return path  # pobrał go inny proces, gdy czekaliśmy na blokadę
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if head["ContentLength"] > PART_SIZE:
+                _download_ranges(s3_client, bucket, key, etag, head["ContentLength"], tmp_path)
+            else:
+                _download_whole(s3_client, bucket, key, etag, tmp_path)
+            _verify(tmp_path, head, etag)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        _remove_other_versions(path, key)
+    return path
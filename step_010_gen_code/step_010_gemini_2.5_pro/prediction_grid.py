@@ -0,0 +1,208 @@
+# prediction_grid.py
+"""Tablica predykcji dla całej dziedziny wejść - predykcja jako odczyt z tablicy.
+
+Dziedzina jest skończona i sprawdzana przez każdy parser: płeć M/F, wiek 18-105,
+czas na 5 km 900-7200 s, czyli 2 x 88 x 6301 ≈ 1,1 mln kombinacji. Zadanie offline
+liczy model (time_sec_model.pkl) raz dla każdej z nich i zapisuje wynik jako tablicę
+.npy (int16, a gdy wartości się nie mieszczą - int32) z opisem w pliku .json
+(wersja formatu, MD5 modelu źródłowego, zakresy osi). Proces serwujący mapuje tablicę
+w pamięci (np.load(mmap_mode='r')) i nie ładuje żadnego obiektu modelu.
+Przy wczytaniu MD5 z opisu jest porównywany z bieżącym plikiem modelu - tablica z innej
+wersji modelu nie jest używana (aplikacja wraca wtedy do modelu).
+
+Użycie:
+    python prediction_grid.py build [--model data/model/time_sec_model] [--engine pycaret|serving]
+    python prediction_grid.py verify [--samples 20000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+GRID_VERSION = 1
+GENDERS = ('M', 'F')
+AGE_RANGE = (18, 105)
+TIME_5KM_RANGE = (900, 7200)
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model', 'time_sec_model')
+DEFAULT_GRID_PATH = f"{DEFAULT_MODEL_PATH}.grid.npy"
+
+
+def meta_path(grid_path: str) -> str:
+    return f"{os.path.splitext(grid_path)[0]}.json"
+
+
+def _file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def check_source(meta: Dict, model_file: Optional[str]) -> None:
+    """ValueError, gdy tablica pochodzi z innej wersji modelu niż `model_file` (np. model przetrenowany)"""
+    if model_file is not None and meta.get('source_md5') != _file_md5(model_file):
+        raise ValueError(f"Tablica predykcji pochodzi z innej wersji modelu niż {os.path.basename(model_file)}"
+                         " - uruchom prediction_grid.py build")
+
+
+class PredictionGrid:
+    """Tablica [płeć, wiek, czas na 5 km] -> przewidywany czas półmaratonu w pełnych sekundach"""
+
+    def __init__(self, values: np.ndarray, meta: Dict):
+        if meta.get('version') != GRID_VERSION:
+            raise ValueError(f"Nieobsługiwana wersja tablicy predykcji: {meta.get('version')}")
+        expected_shape = (len(meta['genders']),
+                          meta['age_range'][1] - meta['age_range'][0] + 1,
+                          meta['time_5km_range'][1] - meta['time_5km_range'][0] + 1)
+        if values.shape != expected_shape:
+            raise ValueError(f"Niezgodny kształt tablicy predykcji: {values.shape}, oczekiwano {expected_shape}")
+        self.values = values
+        self.meta = meta
+        self.genders = {g: i for i, g in enumerate(meta['genders'])}
+        self.age_min, self.age_max = meta['age_range']
+        self.time_min, self.time_max = meta['time_5km_range']
+
+    @property
+    def version(self) -> str:
+        return f"{self.meta['version']}:{self.meta['source_md5']}"
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_GRID_PATH, model_file: Optional[str] = None) -> "PredictionGrid":
+        """Mapuje tablicę; z `model_file` (plik .pkl) sprawdza, czy tablica powstała z tego modelu"""
+        with open(meta_path(path), encoding='utf-8') as f:
+            meta = json.load(f)
+        check_source(meta, model_file)
+        return cls(np.load(path, mmap_mode='r'), meta)
+
+    def lookup(self, gender: str, age: Union[int, float], time_5km_sec: Union[int, float]) -> Optional[int]:
+        """Przewidywany czas w sekundach albo None, gdy wejście jest poza dziedziną tablicy"""
+        g = self.genders.get(gender)
+        a = int(round(age)) - self.age_min
+        t = int(round(time_5km_sec)) - self.time_min
+        if g is None or not (0 <= a <= self.age_max - self.age_min) or not (0 <= t <= self.time_max - self.time_min):
+            return None
+        return int(self.values[g, a, t])
+
+    def lookup_many(self, gender: np.ndarray, age: np.ndarray, time_5km_sec: np.ndarray) -> np.ndarray:
+        """Wektorowo; wejścia spoza dziedziny dają -1"""
+        gender = np.asarray(gender, dtype=object)
+        g = np.array([self.genders.get(v, -1) for v in gender], dtype=np.int64)
+        a = np.rint(np.asarray(age, dtype=np.float64)).astype(np.int64) - self.age_min
+        t = np.rint(np.asarray(time_5km_sec, dtype=np.float64)).astype(np.int64) - self.time_min
+        valid = (g >= 0) & (a >= 0) & (a <= self.age_max - self.age_min) & (t >= 0) & (t <= self.time_max - self.time_min)
+        result = np.full(len(g), -1, dtype=np.int64)
+        result[valid] = self.values[g[valid], a[valid], t[valid]]
+        return result
+
+
+def _domain() -> Tuple[np.ndarray, np.ndarray]:
+    ages = np.arange(AGE_RANGE[0], AGE_RANGE[1] + 1)
+    times = np.arange(TIME_5KM_RANGE[0], TIME_5KM_RANGE[1] + 1)
+    return ages, times
+
+
+def _predictor(model_path: str, engine: str):
+    """Funkcja (płeć, wiek[], czas[]) -> predykcje; pycaret - oryginalny potok, serving - artefakt JSON"""
+    if engine == 'serving':
+        from serving_model import ServingModel, predict_fast
+
+        model = ServingModel.load(f"{model_path}.serving.json")
+        return lambda gender, ages, times: predict_fast(model, gender, ages, times)
+
+    import pandas as pd
+    import pycaret.regression as pcr
+
+    pipeline = pcr.load_model(model_path, verbose=False)
+
+    def predict(gender, ages, times):
+        data = pd.DataFrame({'gender': gender, 'age': ages, '5_km_sec': times.astype(float)})
+        return pcr.predict_model(pipeline, data=data, verbose=False)['prediction_label'].to_numpy()
+    return predict
+
+
+def build(model_path: str = DEFAULT_MODEL_PATH, out_path: str = DEFAULT_GRID_PATH, engine: str = 'pycaret') -> Dict:
+    """Liczy model dla całej dziedziny i zapisuje tablicę .npy oraz opis .json"""
+    predict = _predictor(model_path, engine)
+    ages, times = _domain()
+    ages_col, times_col = (a.ravel() for a in np.meshgrid(ages, times, indexing='ij'))
+
+    grid = np.empty((len(GENDERS), len(ages), len(times)), dtype=np.int64)
+    for i, gender in enumerate(GENDERS):
+        # int() jak w aplikacji - obcięcie części ułamkowej
+        grid[i] = np.trunc(predict(gender, ages_col, times_col)).astype(np.int64).reshape(len(ages), len(times))
+
+    dtype = np.int16 if grid.min() >= np.iinfo(np.int16).min and grid.max() <= np.iinfo(np.int16).max else np.int32
+    meta = {
+        'version': GRID_VERSION,
+        'source': os.path.basename(f"{model_path}.pkl"),
+        'source_md5': _file_md5(f"{model_path}.pkl"),
+        'engine': engine,
+        'dtype': np.dtype(dtype).name,
+        'genders': list(GENDERS),
+        'age_range': list(AGE_RANGE),
+        'time_5km_range': list(TIME_5KM_RANGE),
+    }
+
+    # zapis atomowy - proces serwujący może właśnie mapować poprzednią wersję
+    directory = os.path.dirname(out_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, grid.astype(dtype))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    with open(meta_path(out_path), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def verify(model_path: str = DEFAULT_MODEL_PATH, grid_path: str = DEFAULT_GRID_PATH,
+           engine: str = 'pycaret', samples: int = 20_000, seed: int = 0) -> int:
+    """Porównuje losowe komórki tablicy z modelem; zwraca liczbę sprawdzonych punktów"""
+    grid = PredictionGrid.load(grid_path)
+    if grid.meta['source_md5'] != _file_md5(f"{model_path}.pkl"):
+        raise AssertionError("Tablica predykcji pochodzi z innej wersji modelu - uruchom build")
+
+    predict = _predictor(model_path, engine)
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, samples)
+    times = rng.integers(TIME_5KM_RANGE[0], TIME_5KM_RANGE[1] + 1, samples)
+    for gender in GENDERS:
+        expected = np.trunc(predict(gender, ages, times)).astype(np.int64)
+        actual = grid.lookup_many(np.full(samples, gender, dtype=object), ages, times)
+        mismatches = int(np.count_nonzero(expected != actual))
+        if mismatches:
+            raise AssertionError(f"{mismatches} z {samples} predykcji ({gender}) różni się od modelu")
+    return samples * len(GENDERS)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build', 'verify'])
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="ścieżka modelu PyCaret bez rozszerzenia .pkl")
+    parser.add_argument('--out', '--grid', dest='grid', default=DEFAULT_GRID_PATH)
+    parser.add_argument('--engine', choices=['pycaret', 'serving'], default='pycaret',
+                        help="pycaret - oryginalny potok, serving - artefakt z serving_model.py export")
+    parser.add_argument('--samples', type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        meta = build(args.model, args.grid, args.engine)
+        print(f"Zapisano {args.grid} ({meta['dtype']}, model {meta['source_md5']})")
+    else:
+        checked = verify(args.model, args.grid, args.engine, args.samples)
+        print(f"OK - {checked} predykcji zgodnych z modelem")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
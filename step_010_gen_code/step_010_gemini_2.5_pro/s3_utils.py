@@ -1,36 +1,150 @@
 # s3_utils.py
+# boto3/botocore i pycaret importowane w funkcjach - strona wprowadzania danych ich nie potrzebuje
 import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import pandas as pd
 import streamlit as st
-import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
-from pycaret.regression import load_model
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from etag_cache import ETagCache
 
 load_dotenv()
 
 S3_BUCKET = "wk1"
+CACHE_DIR = os.getenv("HALFMARATHON_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "halfmarathon"))
+COMPACT_DTYPES = {"finish_sec": "int32", "age": "int8", "gender": "category"}
+MODEL_DIR = os.path.join(CACHE_DIR, "models")
+LOADER_MAX_WORKERS = int(os.getenv("LOADER_MAX_WORKERS", "4"))
+LOADER_TIMEOUT_SECONDS = float(os.getenv("LOADER_TIMEOUT_SECONDS", "30"))
+# Statystyki (hit / miss / revalidated) w CSV_CACHE.stats, widoczne także w /ready
+CSV_CACHE = ETagCache(revalidate_after=float(os.getenv("S3_REVALIDATE_SECONDS", "300")))
+
+def _read_feather_cache(path: str) -> pd.DataFrame | None:
+    """Czyta lokalny plik Feather przez memory-map; None, jeśli pliku nie ma."""
+    if not os.path.exists(path):
+        return None
+    import pyarrow.feather as feather
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Zwarte typy kolumn; kolumna liczbowa z brakami zostaje float32 (NaN nie da się rzutować na int)."""
+    return df.astype({
+        col: dtype if dtype == "category" or df[col].notna().all() else "float32"
+        for col, dtype in COMPACT_DTYPES.items()
+    })
+
+def _write_feather_cache(df: pd.DataFrame, path: str) -> None:
+    """Zapisuje Feather bez kompresji (da się go zmapować) atomowo: plik tymczasowy + rename."""
+    import pyarrow.feather as feather
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unikalny plik tymczasowy - ten sam rok mogą zapisywać równocześnie dwie sesje jednego procesu.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Starsze wersje tego pliku nie będą już czytane.
+    stem = os.path.basename(path).split(".", 1)[0]
+    for name in os.listdir(os.path.dirname(path)):
+        other = os.path.join(os.path.dirname(path), name)
+        if re.fullmatch(rf"{re.escape(stem)}\.[0-9A-Za-z-]+\.feather", name) and other != path:
+            try:
+                os.unlink(other)
+            except OSError:
+                pass
 
 @st.cache_resource
 def get_s3_client():
-    """Tworzy i zwraca klienta S3. Wynik jest cachowany dla całej sesji."""
+    """Tworzy i zwraca klienta S3. Wynik jest cachowany dla całej sesji.
+
+    Bez zapytania kontrolnego (list_buckets) przy tworzeniu - błędne klucze zgłosi
+    pierwsze właściwe wywołanie (head_object / get_object), które i tak obsługuje błędy.
+    """
+    import boto3
+    from botocore.exceptions import NoCredentialsError, ClientError
+
     try:
-        s3_client = boto3.client('s3')
-        s3_client.list_buckets()  # Sprawdzenie poprawności połączenia
-        return s3_client
+        return boto3.client('s3')
     except (NoCredentialsError, ClientError) as e:
         st.error(f"Błąd konfiguracji AWS S3. Sprawdź swoje klucze w pliku .env. Błąd: {e}")
         return None
 
-@st.cache_data(ttl=3600)  # Cache na 1 godzinę
+def _shared_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Sortuje wiersze po płci i czasie, a granice każdej płci zapisuje w df.attrs["gender_rows"].
+
+    Dzięki temu podzbiór jednej płci to wycinek (gender_rows), a nie kopia z maski logicznej.
+    """
+    df = df.sort_values(["gender", "finish_sec"], kind="stable", ignore_index=True)
+    codes = df["gender"].cat.codes.to_numpy()
+    df.attrs["gender_rows"] = {
+        str(value): (int(codes.searchsorted(code, "left")), int(codes.searchsorted(code, "right")))
+        for code, value in enumerate(df["gender"].cat.categories)
+    }
+    return df
+
+def gender_rows(df: pd.DataFrame, gender: str | None) -> pd.DataFrame:
+    """Wszystkie wiersze (gender=None) albo wycinek jednej płci - bez kopiowania danych."""
+    if gender is None:
+        return df
+    start, stop = df.attrs["gender_rows"].get(gender, (0, 0))
+    return df.iloc[start:stop]
+
+def _fetch_csv(s3_client, file_key: str, known_etag: str | None):
+    """Pobranie dla ETagCache: None, gdy obiekt o ETagu known_etag się nie zmienił (304)."""
+    from botocore.exceptions import ClientError
+
+    obj = None
+    try:
+        if known_etag is None:
+            etag = s3_client.head_object(Bucket=S3_BUCKET, Key=file_key)['ETag'].strip('"')
+        else:
+            # warunkowy GET: bez zmian - 304 bez treści, po zmianie - od razu nowa treść
+            obj = s3_client.get_object(Bucket=S3_BUCKET, Key=file_key, IfNoneMatch=f'"{known_etag}"')
+            etag = obj['ETag'].strip('"')
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('304', 'NotModified'):
+            return None
+        raise
+
+    stem = os.path.splitext(os.path.basename(file_key))[0]
+    cache_path = os.path.join(CACHE_DIR, f"{stem}.{etag}.feather")
+    df = _read_feather_cache(cache_path)
+    if df is not None:
+        if obj is not None:
+            obj['Body'].close()
+        return etag, _shared_frame(df)
+
+    if obj is None:
+        obj = s3_client.get_object(Bucket=S3_BUCKET, Key=file_key, IfMatch=etag)
+    # Zgodnie z wymaganiem, używamy separatora ';'
+    df = _shared_frame(_compact_dtypes(pd.read_csv(obj['Body'], sep=';')))
+    _write_feather_cache(df, cache_path)
+    return etag, df
+
 def load_csv_from_s3(_s3_client, file_key: str) -> pd.DataFrame | None:
-    """Ładuje plik CSV z S3, używając separatora ';'. Wynik jest cachowany."""
+    """Ładuje plik CSV z S3, używając separatora ';'. Wynik jest cachowany.
+
+    Zamiast TTL: wpis jest sprawdzany co S3_REVALIDATE_SECONDS warunkowym GET-em
+    (If-None-Match) i ładowany ponownie tylko wtedy, gdy plik w S3 się zmienił.
+    Dodatkowo lokalny cache Feather kluczowany ETagiem obiektu: CSV jest parsowany
+    tylko raz na wersję pliku, także między procesami.
+
+    Jedna ramka na proces, współdzielona przez wszystkie sesje. Wyniku NIE WOLNO
+    modyfikować - podzbiory przez gender_rows.
+    """
     if not _s3_client:
         return None
+    from botocore.exceptions import ClientError
+
     try:
-        obj = _s3_client.get_object(Bucket=S3_BUCKET, Key=file_key)
-        # Zgodnie z wymaganiem, używamy separatora ';'
-        return pd.read_csv(obj['Body'], sep=';')
+        return CSV_CACHE.get(file_key, lambda etag: _fetch_csv(_s3_client, file_key, etag))
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchKey':
             st.error(f"Nie znaleziono pliku w S3: {file_key}")
@@ -41,39 +155,89 @@ def load_csv_from_s3(_s3_client, file_key: str) -> pd.DataFrame | None:
         st.error(f"Wystąpił nieoczekiwany błąd podczas przetwarzania pliku CSV: {e}")
         return None
 
-@st.cache_data(ttl=3600)
-def download_file_from_s3(_s3_client, file_key: str, local_path: str):
-    """Pobiera plik z S3 i zapisuje go lokalnie."""
-    if not _s3_client:
-        return False
-    try:
-        _s3_client.download_file(S3_BUCKET, file_key, local_path)
-        return True
-    except ClientError as e:
-        st.error(f"Błąd S3 podczas pobierania modelu '{file_key}': {e}")
-        return False
+def results_file_key(year: int) -> str:
+    return f"zadanie_9/current/halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
+
+@st.cache_resource
+def _get_loader_pool() -> ThreadPoolExecutor:
+    """Jedna ograniczona pula wątków na proces, wspólna dla wszystkich sesji."""
+    return ThreadPoolExecutor(max_workers=LOADER_MAX_WORKERS, thread_name_prefix="s3-loader")
+
+def load_years_from_s3(_s3_client, years: list[int], timeout: float = LOADER_TIMEOUT_SECONDS):
+    """Ładuje dane kilku lat równolegle - na zimnym cache czas najwolniejszego roku, a nie suma.
+
+    Zwraca (słownik rok -> DataFrame lub None przy błędzie, lista lat, które nie zdążyły w `timeout`).
+    Rok, który nie zdążył, ładuje się dalej w tle i trafi do cache na następne odświeżenie.
+    """
+    ctx = get_script_run_ctx()
+
+    def load(year: int):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return load_csv_from_s3(_s3_client, results_file_key(year))
+
+    futures = {year: _get_loader_pool().submit(load, year) for year in years}
+    done, _ = wait(futures.values(), timeout=timeout)
+    frames, timed_out = {}, []
+    for year, future in futures.items():
+        if future not in done:
+            timed_out.append(year)
+            frames[year] = None
+        else:
+            frames[year] = future.result() if future.exception() is None else None
+    return frames, timed_out
 
 @st.cache_resource
 def get_prediction_model():
-    """Ładuje model PyCaret, pobierając go z S3, jeśli nie istnieje lokalnie."""
+    """Ładuje model PyCaret z lokalnej kopii bieżącej wersji w S3 (pobieranej najwyżej raz na wersję)."""
     s3_client = get_s3_client()
     if not s3_client:
         return None
 
+    from model_fetch import fetch
+
     model_s3_key = "zadanie_9/models/time_sec_model.pkl"
-    local_model_path_base = "time_sec_model"
-    local_model_path_pkl = f"{local_model_path_base}.pkl"
+    try:
+        with st.spinner("Sprawdzanie i pobieranie modelu..."):
+            local_model_path_pkl = fetch(s3_client, S3_BUCKET, model_s3_key, MODEL_DIR)
+    except Exception as e:
+        st.error(f"Błąd S3 podczas pobierania modelu '{model_s3_key}': {e}")
+        return None
 
-    if not os.path.exists(local_model_path_pkl):
-        st.info("Model nie istnieje lokalnie. Pobieranie z S3...")
-        with st.spinner("Pobieranie modelu... To może chwilę potrwać."):
-            if not download_file_from_s3(s3_client, model_s3_key, local_model_path_pkl):
-                return None
+    from pycaret.regression import load_model
 
     try:
-        model = load_model(local_model_path_base)
+        model = load_model(local_model_path_pkl[:-len(".pkl")])
         st.success("Model predykcyjny został pomyślnie załadowany.")
         return model
     except Exception as e:
         st.error(f"Nie udało się załadować modelu PyCaret z pliku. Błąd: {e}")
         return None
+
+@st.cache_resource
+def get_prediction_grid():
+    """Ładuje tablicę predykcji (prediction_grid.py build), pobierając ją z S3, jeśli nie istnieje lokalnie.
+    Zwraca None, gdy tablicy nie ma albo pochodzi z innej wersji modelu - wtedy predykcję liczy model PyCaret."""
+    import json
+    import numpy as np
+    from model_fetch import fetch
+    from prediction_grid import PredictionGrid, check_source
+
+    s3_client = get_s3_client()
+    if not s3_client:
+        return None
+    try:
+        grid_path = fetch(s3_client, S3_BUCKET, "zadanie_9/models/time_sec_model.grid.npy", MODEL_DIR)
+        meta_path = fetch(s3_client, S3_BUCKET, "zadanie_9/models/time_sec_model.grid.json", MODEL_DIR)
+        model_path = fetch(s3_client, S3_BUCKET, "zadanie_9/models/time_sec_model.pkl", MODEL_DIR)
+    except Exception:
+        return None
+
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        # Tablica zbudowana z innej wersji modelu (np. po ponownym treningu) dawałaby stare prognozy.
+        check_source(meta, model_path)
+        return PredictionGrid(np.load(grid_path, mmap_mode="r"), meta)
+    except (OSError, ValueError) as e:
+        st.warning(f"Nie udało się wczytać tablicy predykcji, używam modelu. Błąd: {e}")
+        return None
@@ -0,0 +1,18 @@
+# serve.py
+"""Start serwera Streamlit z rozgrzewaniem w tle: `python serve.py [opcje streamlit run]`.
+
+Rozgrzewanie (warmup.py) rusza razem z procesem, a nie przy pierwszej sesji użytkownika.
+"""
+import os
+import sys
+
+import warmup
+
+if __name__ == "__main__":
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    warmup.start()
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", app_path, *sys.argv[1:]]
+    sys.exit(stcli.main())
@@ -0,0 +1,122 @@
+# warmup.py
+"""Rozgrzewanie aplikacji przy starcie serwera i endpoint gotowości dla load balancera.
+
+W wątku tła: klient S3, tablica predykcji lub model PyCaret (pobranie + deserializacja),
+dane historyczne wszystkich lat i ciężkie importy strony wyników. Dopóki to trwa,
+GET /ready zwraca 503, potem 200 - load balancer kieruje użytkowników tylko do
+rozgrzanych replik, więc pierwszy użytkownik nie czeka na model.
+
+Start serwera z rozgrzewaniem: `python serve.py` (zamiast `streamlit run app.py`).
+Endpoint: http://localhost:$READINESS_PORT/ready (oraz /live).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+RESULT_YEARS = [2024, 2023]
+RUNTIME_WAIT_SECONDS = 120
+
+_lock = threading.Lock()
+_started = False
+_ready = threading.Event()
+_status = {"state": "pending", "steps": {}, "errors": {}}
+
+
+def _wait_for_runtime() -> bool:
+    """Rozgrzewane cache (cache_resource i ETagCache danych) są wspólne dla procesu, ale funkcje ładujące
+    wołają st.spinner/st.error - rozgrzewanie musi poczekać, aż powstanie środowisko Streamlit."""
+    from streamlit import runtime
+
+    deadline = time.monotonic() + RUNTIME_WAIT_SECONDS
+    while not runtime.exists():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def _step(name: str, func):
+    start = time.perf_counter()
+    try:
+        return func()
+    except Exception as e:
+        _status["errors"][name] = str(e)
+        logger.warning("Rozgrzewanie: krok %s nieudany: %s", name, e)
+        return None
+    finally:
+        _status["steps"][name] = round(time.perf_counter() - start, 3)
+
+
+def _run() -> None:
+    _status["state"] = "running"
+    if not _wait_for_runtime():
+        _status["state"] = "failed"
+        _status["errors"]["runtime"] = "Środowisko Streamlit nie wystartowało"
+        return
+
+    from s3_utils import get_prediction_grid, get_prediction_model, get_s3_client, load_years_from_s3
+
+    s3_client = _step("s3_client", get_s3_client)
+    grid = _step("prediction_grid", get_prediction_grid)
+    # model PyCaret tylko gdy nie ma tablicy predykcji - inaczej nie jest potrzebny w ścieżce żądania
+    model = grid if grid is not None else _step("model", get_prediction_model)
+    if s3_client is not None:
+        _step("datasets", lambda: load_years_from_s3(s3_client, RESULT_YEARS))
+    _step("imports", lambda: (__import__("matplotlib.pyplot"), __import__("seaborn")))
+
+    _status["state"] = "ready" if model is not None else "failed"
+    if model is not None:
+        _ready.set()
+
+
+def start() -> None:
+    """Uruchamia rozgrzewanie (raz na proces) i serwer gotowości, gdy ustawiono READINESS_PORT."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+    port = int(os.getenv("READINESS_PORT", "0") or 0)
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+        except OSError as e:
+            logger.warning("Serwer gotowości nie wystartował na porcie %s: %s", port, e)
+            return
+        threading.Thread(target=server.serve_forever, name="readiness-http", daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def status() -> dict:
+    from s3_utils import CSV_CACHE
+
+    return {"ready": is_ready(), **_status, "csv_cache": dict(CSV_CACHE.stats)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/live":
+            code, body = 200, {"live": True}
+        elif path == "/ready":
+            code, body = (200 if is_ready() else 503), status()
+        else:
+            code, body = 404, {"error": "not found"}
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
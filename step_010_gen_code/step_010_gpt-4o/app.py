@@ -2,14 +2,16 @@ import streamlit as st
 import pandas as pd
 import os
 import re
+import tempfile
+import threading
+import time
+from collections import Counter
 from datetime import timedelta
 from dataclasses import dataclass
 from typing import Dict, Any
+from functools import lru_cache
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
-import seaborn as sns
-import boto3
-from pycaret.regression import load_model, predict_model
+# matplotlib, seaborn, boto3 and pycaret are imported lazily - the input page does not need them
 
 # Load environment variables
 load_dotenv()
@@ -30,29 +32,142 @@ class OpenAI:
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Initialize S3 client
-s3 = boto3.client("s3")
 BUCKET_NAME = "wk1"
+COMPACT_DTYPES = {"finish_sec": "int32", "age": "int8", "gender": "category"}
+
+def _compact_dtypes(df):
+    # Integer columns with missing values cannot be cast to int - they stay float32
+    return df.astype({
+        col: dtype if dtype == "category" or df[col].notna().all() else "float32"
+        for col, dtype in COMPACT_DTYPES.items()
+    })
+
+@lru_cache(maxsize=1)
+def get_s3():
+    # S3 client is created on first use
+    import boto3
+    return boto3.client("s3")
 
 @st.cache_data
 def get_model():
+    from pycaret.regression import load_model
     try:
         return load_model("time_sec_model", platform="aws", authentication={"bucket": BUCKET_NAME, "path": "zadanie_9/models"})
     except Exception as e:
         st.error(f"Error loading model: {str(e)}.")
         raise Exception("Model not found.")
 
-@st.cache_data
-def get_full_csv_df(year):
-    file_name = f"halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
-    s3_file_name = f"zadanie_9/current/{file_name}"
-    local_path = file_name
+def _load_csv(file_name, s3_file_name, etag):
+    import pyarrow.feather as feather
+    # Columnar cache keyed by the S3 ETag - download and CSV parsing only once per object version
+    cache_path = f"{os.path.splitext(file_name)[0]}.{etag}.feather"
+    if os.path.exists(cache_path):
+        return feather.read_feather(cache_path, memory_map=True)
+    # Unique file names per writer - sessions of one process may load the same year concurrently
+    directory = os.path.dirname(cache_path) or "."
+    local_path = _temp_path(directory, ".csv")
     try:
-        s3.download_file(BUCKET_NAME, s3_file_name, local_path)
+        get_s3().download_file(BUCKET_NAME, s3_file_name, local_path)
+        df = _compact_dtypes(pd.read_csv(local_path, sep=";"))
     except Exception as e:
         st.error(f"Error loading marathon CSV: {str(e)}.")
         raise Exception(f"Error downloading {s3_file_name} to {local_path}")
-    return pd.read_csv(local_path, sep=";")
+    finally:
+        # The CSV is only needed until it is parsed
+        _remove_files([local_path])
+    tmp_path = _temp_path(directory, ".tmp")
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Older versions of the cache are never read again
+    _remove_files(_other_versions(cache_path))
+    return df
+
+def _temp_path(directory, suffix):
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    return path
+
+def _other_versions(cache_path):
+    directory = os.path.dirname(cache_path) or "."
+    stem = os.path.basename(cache_path).split(".", 1)[0]
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if re.fullmatch(rf"{re.escape(stem)}\.[0-9A-Za-z-]+\.feather", name)
+            and name != os.path.basename(cache_path)]
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # already removed by another session, or still mapped on Windows
+
+REVALIDATE_SECONDS = float(os.getenv("S3_REVALIDATE_SECONDS", "300"))
+
+@st.cache_resource
+def get_csv_cache():
+    # Shared by all sessions: per-year entries and hit / miss / revalidated counters
+    return {"entries": {}, "lock": threading.Lock(), "stats": Counter()}
+
+def get_csv_entry(year):
+    """(etag, df) for the year; revalidated with a HEAD request every REVALIDATE_SECONDS instead of a TTL reload"""
+    file_name = f"halfmarathon_wroclaw_{year}__final_cleaned_full.csv"
+    s3_file_name = f"zadanie_9/current/{file_name}"
+    cache = get_csv_cache()
+    with cache["lock"]:
+        entry = cache["entries"].setdefault(year, {"lock": threading.Lock(), "etag": None, "df": None, "checked_at": 0.0})
+    # one load per year at a time - other sessions wait for its result
+    with entry["lock"]:
+        if entry["etag"] is not None and time.monotonic() - entry["checked_at"] < REVALIDATE_SECONDS:
+            result = "hit"
+        else:
+            try:
+                etag = get_s3().head_object(Bucket=BUCKET_NAME, Key=s3_file_name)["ETag"].strip('"')
+            except Exception as e:
+                st.error(f"Error loading marathon CSV: {str(e)}.")
+                raise
+            if etag == entry["etag"]:
+                result = "revalidated"
+            else:
+                result = "miss"
+                entry["df"] = _load_csv(file_name, s3_file_name, etag)
+                entry["etag"] = etag
+            entry["checked_at"] = time.monotonic()
+        with cache["lock"]:
+            cache["stats"][result] += 1
+        return entry["etag"], entry["df"]
+
+def get_full_csv_df(year):
+    # The frame is shared across sessions - filter into new frames, never modify it in place
+    return get_csv_entry(year)[1]
+
+MAX_FINISH_SEC = 4 * 3600
+
+def get_rank_table(year, sex=None):
+    etag, df = get_csv_entry(year)
+    return _build_rank_table(year, sex, etag, df)
+
+# etag is part of the cache key - a new object version gets a new table
+@st.cache_resource(max_entries=12)
+def _build_rank_table(year, sex, etag, _df):
+    # counts[s] = number of runners faster than s seconds (0-4h), so rank is a single lookup
+    import numpy as np
+    df = _df
+    if sex is not None:
+        df = df[df['gender'].str.upper() == sex]
+    seconds = np.clip(np.ceil(df['finish_sec'].dropna().to_numpy(dtype=float)).astype(int), 0, MAX_FINISH_SEC + 1)
+    counts = np.zeros(MAX_FINISH_SEC + 2, dtype=np.int32)
+    counts[1:] = np.cumsum(np.bincount(seconds, minlength=MAX_FINISH_SEC + 2))[:-1]
+    counts[-1] = len(seconds)
+    counts.setflags(write=False)
+    return counts
+
+def rank_by_time(year, finish_sec, sex=None):
+    counts = get_rank_table(year, sex)
+    return int(counts[min(max(int(finish_sec), 0), MAX_FINISH_SEC + 1)]) + 1, int(counts[-1])
 
 @dataclass
 class RunnerInfo:
@@ -192,6 +307,7 @@ def display_summary_page():
     st.write(f"Czas na 5 km: {runner.time_5k_str()}")
 
     if st.button("Oszacuj czas w półmaratonie"):
+        from pycaret.regression import predict_model
         try:
             model = get_model()
             input_data = pd.DataFrame([runner.to_dict()])
@@ -207,22 +323,28 @@ def display_summary_page():
         st.rerun()
 
 def display_results_page():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     st.header("Wyniki predykcji")
 
     prediction_seconds = st.session_state.prediction_seconds
     predicted_time = timedelta(seconds=prediction_seconds)
     st.write(f"Przewidywany czas półmaratonu: {predicted_time}")
 
-    tab1, tab2 = st.tabs(["Wizualizacja 2023", "Wizualizacja 2024"])
+    # only the selected tab runs (on_change="rerun" + tab.open), and the radio reruns just its own fragment
+    tab1, tab2 = st.tabs(["Wizualizacja 2023", "Wizualizacja 2024"], key="results_tabs", on_change="rerun")
 
+    @st.fragment
     def plot_graph(year: int):
         df = get_full_csv_df(year)
         runner = st.session_state.runner_info
 
         filter_option = st.radio("Wizualizuj względem:", [f"Wszyscy {year}", "Tylko moja płeć"], horizontal=True)
+        rank_sex = runner.sex if filter_option == "Tylko moja płeć" else None
 
-        if filter_option == "Tylko moja płeć":
-            df = df[df['gender'].str.upper() == runner.sex]
+        if rank_sex:
+            df = df[df['gender'].str.upper() == rank_sex]
 
         fig, ax = plt.subplots()
         sns.scatterplot(data=df, x="age", y="finish_sec", ax=ax, color="grey", label='Inni biegacze', alpha=0.5)
@@ -234,16 +356,17 @@ def display_results_page():
 
         st.pyplot(fig)
 
-        # Calculate rank by time
-        current_time = st.session_state.prediction_seconds
-        rank = (df['finish_sec'] < current_time).sum() + 1
-        st.write(f"Szacowane miejsce: {rank}/{len(df)}")
+        # Rank by time from the precomputed cumulative counts
+        rank, total = rank_by_time(year, st.session_state.prediction_seconds, rank_sex)
+        st.write(f"Szacowane miejsce: {rank}/{total}")
 
-    with tab1:
-        plot_graph(2023)
+    if tab1.open:
+        with tab1:
+            plot_graph(2023)
 
-    with tab2:
-        plot_graph(2024)
+    if tab2.open:
+        with tab2:
+            plot_graph(2024)
 
     if st.button("Powrót do wprowadzania danych"):
         st.session_state.page = "input"